@@ -0,0 +1,487 @@
+"""
+Benchmarks for the env hot paths on fixed seeded positions, with JSON baselines to catch regressions
+
+    python -m cathedral_rl.benchmark --save baseline.json
+    python -m cathedral_rl.benchmark --compare baseline.json --threshold 0.2
+    python -m cathedral_rl.benchmark --startup --filter startup
+
+Positions are taken from seeded random games: an opening, a mid-game position, and an endgame position just before
+a move which captures a piece. Each benchmark reports median ops/sec (from the median latency), mean ops/sec,
+percentile latencies and the best latency of the repeats (in microseconds).
+Benchmarks which compute territories run with the process-wide territory cache disabled, the *_cached variants
+measure the cache hit path (the warmup calls fill the cache).
+When comparing, the exit status is 1 if the best latency of any benchmark is slower than the baseline by more than
+the threshold and by more than --min-delta-us microseconds. The whole suite is run --rounds times and the best latency
+is taken over every round, as it is the least affected by other processes. The mean and median are reported for
+information only: a few outliers move the mean by tens of percents, and the median shifts with the load of the
+machine. The latency of microsecond benchmarks shifts by a few microseconds between runs, hence --min-delta-us.
+With --startup, import time and time to first reset and first step are measured in fresh interpreters.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from cathedral_rl.game.board import Board
+from cathedral_rl.game.cathedral import env as wrapped_env
+from cathedral_rl.game.cathedral import fast_env, raw_env
+from cathedral_rl.game.policies import RandomPolicy
+
+OPENING_PLY = 3
+MIDGAME_PLY = 12
+DEFAULT_REPEAT = 50
+DEFAULT_ROUNDS = 3
+DEFAULT_STARTUP_REPEAT = 5
+DEFAULT_THRESHOLD = 0.2
+DEFAULT_MIN_DELTA_US = 5.0
+PERCENTILES = (50, 90, 99)
+
+
+class Position:
+    """
+    Game state (see raw_env.get_state) and the move played from it in the seeded game
+    """
+
+    def __init__(self, name, state, action):
+        self.name = name
+        self.state = state
+        self.action = action
+
+
+# Plays a seeded random game, returns the env states and actions of every ply and the plies capturing a piece
+def play_seeded_game(seed):
+    env = raw_env()
+    env.reset()
+    policy = RandomPolicy(env, seed)
+    states, actions, captures = [], [], []
+    while env.agents:
+        agent = env.agent_selection
+        observation = env.observe(agent)
+        action = policy(observation, agent)
+        states.append(env.get_state())
+        actions.append(action)
+        num_unplaced = sum(len(p) for p in env.board.unplaced_pieces.values())
+        env.step(action)
+        # A capture puts the removed piece back into its owner's unplaced pieces
+        if sum(len(p) for p in env.board.unplaced_pieces.values()) == num_unplaced:
+            captures.append(len(actions) - 1)
+    return states, actions, captures
+
+
+# Opening, mid-game and capture endgame positions (deterministic, the same on every run)
+def get_positions(seed=0, max_seeds=100):
+    states, actions, _ = play_seeded_game(seed)
+    positions = [
+        Position("opening", states[OPENING_PLY], actions[OPENING_PLY]),
+        Position("midgame", states[MIDGAME_PLY], actions[MIDGAME_PLY]),
+    ]
+    for endgame_seed in range(seed, seed + max_seeds):
+        states, actions, captures = play_seeded_game(endgame_seed)
+        if captures:
+            ply = captures[-1]
+            positions.append(Position("endgame", states[ply], actions[ply]))
+            break
+    return positions
+
+
+# Times fn() repeat times (after warmup calls), setup() is called before each call and is not timed
+# Returns per-call latencies in seconds
+def measure(fn, setup=None, repeat=DEFAULT_REPEAT, warmup=3):
+    latencies = np.zeros(repeat)
+    for i in range(-warmup, repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if i >= 0:
+            latencies[i] = elapsed
+    return latencies
+
+
+def summarize(latencies):
+    result = {
+        "median_ops_per_sec": float(1 / np.median(latencies)),
+        "ops_per_sec": float(len(latencies) / latencies.sum()),
+    }
+    for p in PERCENTILES:
+        result[f"p{p}_us"] = float(np.percentile(latencies, p) * 1e6)
+    result["best_us"] = float(latencies.min() * 1e6)
+    return result
+
+
+# Runs bench with the territory cache (shared by every Board of the process) disabled, so that every timed call
+# computes the territories instead of reading them from the cache
+def uncached(bench):
+    def run(env, position, repeat):
+        territory_cache = Board.territory_cache
+        Board.territory_cache = None
+        try:
+            return bench(env, position, repeat)
+        finally:
+            Board.territory_cache = territory_cache
+
+    return run
+
+
+# Benchmark functions: (env, position, repeat) -> latencies
+def bench_reset(env, position, repeat):
+    return measure(env.reset, repeat=repeat)
+
+
+def bench_reset_from_state(env, position, repeat):
+    return measure(lambda: env.reset(options={"state": position.state}), repeat=repeat)
+
+
+def bench_step(env, position, repeat):
+    def setup():
+        env.reset(options={"state": position.state})
+        env.observe(env.agent_selection)
+
+    return measure(lambda: env.step(position.action), setup, repeat)
+
+
+# step() through the wrappers of env() and with the inlined checks of fast_env (the difference is the wrapper overhead)
+def bench_step_wrapped(env, position, repeat):
+    return bench_step(wrapped_env(), position, repeat)
+
+
+def bench_step_fast(env, position, repeat):
+    return bench_step(fast_env(), position, repeat)
+
+
+# step(None) for a truncated agent does no board work, only the checks and _was_dead_step
+# The setup (observing the position) evicts most of the caches, so a twin env takes the same step first to warm
+# them up again, but the latency still depends somewhat on the position: the overhead which the wrappers add is the
+# difference with raw_env on the same position (printed by run_benchmarks)
+def _step_overhead(env_fn, position, repeat):
+    env, twin = env_fn(), env_fn()
+
+    def setup():
+        for e in [env, twin]:
+            e.reset(options={"state": position.state})
+            e.observe(e.agent_selection)
+            for agent in e.possible_agents:
+                e.truncations[agent] = True
+        twin.step(None)
+
+    return measure(lambda: env.step(None), setup, repeat)
+
+
+def bench_step_overhead(env, position, repeat):
+    return _step_overhead(raw_env, position, repeat)
+
+
+def bench_step_overhead_wrapped(env, position, repeat):
+    return _step_overhead(wrapped_env, position, repeat)
+
+
+def bench_step_overhead_fast(env, position, repeat):
+    return _step_overhead(fast_env, position, repeat)
+
+
+def bench_observe(env, position, repeat):
+    env.reset(options={"state": position.state})
+    agent = env.agent_selection
+    env.observe(agent)
+    return measure(lambda: env.observe(agent), repeat=repeat)
+
+
+def bench_calculate_legal_moves(env, position, repeat):
+    env.reset(options={"state": position.state})
+    agent = env.agent_selection
+    return measure(lambda: env._calculate_legal_moves(agent), repeat=repeat)
+
+
+def bench_has_legal_move(env, position, repeat):
+    env.reset(options={"state": position.state})
+    agent = env.agent_selection
+    return measure(lambda: env.board.has_legal_move(agent), repeat=repeat)
+
+
+def bench_check_territory(env, position, repeat):
+    agent = position.state["agent_selection"]
+
+    def setup():
+        env.board.set_state(position.state["board"])
+        env.board.play_turn(agent, position.action)
+
+    return measure(lambda: env.board.check_territory(agent), setup, repeat)
+
+
+def bench_get_territory(env, position, repeat):
+    def setup():
+        env.board.set_state(position.state["board"])
+        env.board.previous_territory = env.board.territory.copy()
+
+    return measure(env.board.get_territory, setup, repeat)
+
+
+BENCHMARKS = {
+    "reset": bench_reset,
+    "reset_from_state": bench_reset_from_state,
+    "step": uncached(bench_step),
+    "step_cached": bench_step,
+    "step_wrapped": uncached(bench_step_wrapped),
+    "step_fast": uncached(bench_step_fast),
+    "step_overhead": bench_step_overhead,
+    "step_overhead_wrapped": bench_step_overhead_wrapped,
+    "step_overhead_fast": bench_step_overhead_fast,
+    "observe": bench_observe,
+    "calculate_legal_moves": bench_calculate_legal_moves,
+    "has_legal_move": bench_has_legal_move,
+    "check_territory": uncached(bench_check_territory),
+    "check_territory_cached": bench_check_territory,
+    "get_territory": uncached(bench_get_territory),
+    "get_territory_cached": bench_get_territory,
+}
+
+
+# Runs every benchmark (or those whose name contains one of the filters) on every position
+# Returns {"benchmark/position": summary}
+# The whole suite is run rounds times and the latencies of every round are summarized together, so that the best
+# latency of a benchmark is not taken from a single period of time in which the machine may be busy
+def run_benchmarks(
+    repeat=DEFAULT_REPEAT,
+    filters=None,
+    positions=None,
+    verbose=True,
+    rounds=DEFAULT_ROUNDS,
+):
+    positions = positions if positions is not None else get_positions()
+    latencies = {}
+    for _ in range(rounds):
+        for bench_name, bench in BENCHMARKS.items():
+            for position in positions:
+                name = f"{bench_name}/{position.name}"
+                if filters and not any(f in name for f in filters):
+                    continue
+                env = raw_env()
+                env.reset()
+                latencies.setdefault(name, []).append(bench(env, position, repeat))
+    results = {}
+    for name, runs in latencies.items():
+        results[name] = summarize(np.concatenate(runs))
+        if verbose:
+            print(format_result(name, results[name]))
+    if verbose:
+        for line in format_wrapper_overhead(results, positions):
+            print(line)
+    return results
+
+
+# Median latency added by the wrappers of env() and by the inlined checks of fast_env, relative to raw_env
+def format_wrapper_overhead(results, positions):
+    lines = []
+    for variant in ["wrapped", "fast"]:
+        for position in positions:
+            raw = results.get(f"step_overhead/{position.name}")
+            other = results.get(f"step_overhead_{variant}/{position.name}")
+            if raw is not None and other is not None:
+                overhead = other["p50_us"] - raw["p50_us"]
+                name = f"overhead_{variant}/{position.name}"
+                lines.append(f"{name:36s} {overhead:+10.1f}us p50 vs raw_env")
+    return lines
+
+
+# Runs in a fresh interpreter: times (seconds since the script started) after importing the env module, after the
+# first reset (which precalculates the action tables) and after the first step, and whether pygame was imported
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from cathedral_rl import cathedral_v0
+imported = time.perf_counter()
+env = cathedral_v0.env()
+env.reset()
+first_reset = time.perf_counter()
+observation, _, _, _, _ = env.last()
+env.step(int(observation["action_mask"].nonzero()[0][0]))
+first_step = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "first_reset": first_reset - start,
+    "first_step": first_step - start,
+    "pygame_imported": "pygame" in sys.modules,
+}))
+"""
+
+
+# Startup benchmarks, each run in a new interpreter: returns {"startup/...": summary}
+def run_startup_benchmarks(repeat=DEFAULT_STARTUP_REPEAT, filters=None, verbose=True):
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [package_root] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+    )
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _STARTUP_SCRIPT],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    results = {}
+    for phase in ["import", "first_reset", "first_step"]:
+        name = f"startup/{phase}"
+        if filters and not any(f in name for f in filters):
+            continue
+        results[name] = summarize(np.array([run[phase] for run in runs]))
+        if verbose:
+            print(format_result(name, results[name]))
+    if verbose and any(run["pygame_imported"] for run in runs):
+        print("pygame was imported without rendering")
+    return results
+
+
+def format_result(name, result):
+    percentiles = "  ".join(f"p{p} {result[f'p{p}_us']:10.1f}us" for p in PERCENTILES)
+    return (
+        f"{name:36s} {median_ops_per_sec(result):12.1f} ops/s "
+        f"(mean {result['ops_per_sec']:10.1f})  {percentiles}  "
+        f"best {result['best_us']:10.1f}us"
+    )
+
+
+# Baselines saved before the median was recorded have the median latency
+def median_ops_per_sec(result):
+    if "median_ops_per_sec" in result:
+        return result["median_ops_per_sec"]
+    return 1e6 / result["p50_us"]
+
+
+# Baselines saved before the best latency was recorded are compared on the median latency
+def best_latency_us(result):
+    return result.get("best_us", result["p50_us"])
+
+
+def environment_info():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def save_baseline(path, results):
+    with open(path, "w") as f:
+        json.dump({"environment": environment_info(), "results": results}, f, indent=2)
+
+
+# Benchmarks whose best ops/sec dropped by more than threshold (fraction) relative to the baseline, and whose best
+# latency grew by more than min_delta_us microseconds
+# Returns {name: (baseline best ops/sec, current best ops/sec)}
+def find_regressions(
+    results, baseline, threshold=DEFAULT_THRESHOLD, min_delta_us=DEFAULT_MIN_DELTA_US
+):
+    regressions = {}
+    for name, result in results.items():
+        if name not in baseline["results"]:
+            continue
+        baseline_us = best_latency_us(baseline["results"][name])
+        latency_us = best_latency_us(result)
+        baseline_ops, ops = 1e6 / baseline_us, 1e6 / latency_us
+        if (
+            ops < baseline_ops * (1 - threshold)
+            and latency_us - baseline_us > min_delta_us
+        ):
+            regressions[name] = (baseline_ops, ops)
+    return regressions
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Cathedral env hot paths."
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=DEFAULT_REPEAT,
+        help="Number of timed calls per benchmark and position in each round.",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=DEFAULT_ROUNDS,
+        help="Number of times the whole suite is run, the timed calls of every round are summarized together.",
+    )
+    parser.add_argument(
+        "--filter",
+        type=str,
+        nargs="*",
+        default=None,
+        help="Only run benchmarks whose name (benchmark/position) contains one of these strings.",
+    )
+    parser.add_argument(
+        "--startup",
+        action="store_true",
+        help="Also measure import time and time to first step in fresh interpreters.",
+    )
+    parser.add_argument(
+        "--startup-repeat",
+        type=int,
+        default=DEFAULT_STARTUP_REPEAT,
+        help="Number of fresh interpreters to start for the startup benchmarks.",
+    )
+    parser.add_argument(
+        "--save", type=str, default=None, help="Save results as a JSON baseline."
+    )
+    parser.add_argument(
+        "--compare",
+        type=str,
+        default=None,
+        help="Compare results against a JSON baseline.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Maximum allowed slowdown of the best latency relative to the baseline (0.2 = 20%% fewer ops/sec).",
+    )
+    parser.add_argument(
+        "--min-delta-us",
+        type=float,
+        default=DEFAULT_MIN_DELTA_US,
+        help="Minimum increase of the best latency (microseconds) reported as a regression.",
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    results = {}
+    if args.startup:
+        results.update(run_startup_benchmarks(args.startup_repeat, args.filter))
+    if not args.filter or any(not f.startswith("startup") for f in args.filter):
+        results.update(
+            run_benchmarks(repeat=args.repeat, filters=args.filter, rounds=args.rounds)
+        )
+    if args.save is not None:
+        save_baseline(args.save, results)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(
+            results, baseline, args.threshold, args.min_delta_us
+        )
+        for name, (baseline_ops, ops) in regressions.items():
+            print(
+                f"REGRESSION {name}: {ops:.1f} best ops/s "
+                f"(baseline {baseline_ops:.1f} ops/s, {ops / baseline_ops - 1:+.0%})"
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
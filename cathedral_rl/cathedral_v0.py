@@ -1,2 +1,2 @@
-from cathedral_rl.game.cathedral import env, raw_env  # noqa: F401
+from cathedral_rl.game.cathedral import env, fast_env, raw_env  # noqa: F401
 from cathedral_rl.game.manual_policy import ManualPolicy  # noqa: F401
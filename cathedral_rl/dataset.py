@@ -0,0 +1,480 @@
+"""
+Self-play datasets for offline RL, stored as fixed-size .npy shards with a JSON manifest
+
+Generate a dataset with built-in policies (random, greedy), using several processes:
+
+    python -m cathedral_rl.dataset --output data/ --games 10000 --policy greedy --workers 8 --packed
+
+Each transition is (observation, action_mask, action, reward, done, agent) for one move of one agent:
+    reward: env.rewards[agent] after the move, the last transition of each agent gets its final reward instead
+    done: True for the last transition of each agent in a game
+Shards are preallocated with np.lib.format.open_memmap and flushed as they fill, so memory use does not grow with the
+size of the dataset. The last shard of each worker may be partially filled, see "size" in the manifest.
+
+Sample training batches without loading the dataset into memory:
+
+    dataset = ShardedDataset("data/", unpack=True)
+    with dataset.batches(batch_size=256, seed=0) as batches:
+        batch = next(batches)  # dict of arrays: batch["observation"].shape == (256, 10, 10, 5)
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from cathedral_rl.game.cathedral import raw_env
+from cathedral_rl.game.encoding import (
+    OBSERVATION_SHAPE,
+    PACKED_OBSERVATION_SIZE,
+    pack_action_masks,
+    pack_observations,
+    packed_mask_size,
+    unpack_action_masks,
+    unpack_observations,
+)
+from cathedral_rl.game.policies import POLICIES, get_policy
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+DEFAULT_SHARD_SIZE = 65536
+
+# Upper bound on the number of moves in a game (29 pieces, plus pieces placed again after being captured)
+MAX_GAME_PLIES = 256
+
+
+# Shape (per transition) and dtype of each field in a shard
+def field_specs(num_actions, packed=False):
+    if packed:
+        observation = ((PACKED_OBSERVATION_SIZE,), "uint8")
+        action_mask = ((packed_mask_size(num_actions),), "uint8")
+    else:
+        observation = (OBSERVATION_SHAPE, "int8")
+        action_mask = ((num_actions,), "int8")
+    return {
+        "observation": observation,
+        "action_mask": action_mask,
+        "action": ((), "uint16"),
+        "reward": ((), "float32"),
+        "done": ((), "bool"),
+        "agent": ((), "uint8"),
+    }
+
+
+class ShardWriter:
+    """
+    Streams transitions into preallocated memory-mapped .npy shards of shard_size rows per field
+    """
+
+    def __init__(self, output_dir, prefix, specs, shard_size=DEFAULT_SHARD_SIZE):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.specs = specs
+        self.shard_size = shard_size
+        self.shards = []
+        self.arrays = None
+        self.size = 0
+
+    def _open(self):
+        index = len(self.shards)
+        files = {
+            field: f"{field}-{self.prefix}-{index:05d}.npy" for field in self.specs
+        }
+        self.arrays = {
+            field: np.lib.format.open_memmap(
+                os.path.join(self.output_dir, files[field]),
+                mode="w+",
+                dtype=dtype,
+                shape=(self.shard_size,) + tuple(shape),
+            )
+            for field, (shape, dtype) in self.specs.items()
+        }
+        self.shards.append({"files": files, "size": 0})
+        self.size = 0
+
+    def _flush(self):
+        for array in self.arrays.values():
+            array.flush()
+        self.shards[-1]["size"] = self.size
+        self.arrays = None
+
+    # Appends the first n rows of each array in the dict of buffers (one array per field)
+    def write(self, buffers, n):
+        start = 0
+        while start < n:
+            if self.arrays is None:
+                self._open()
+            count = min(n - start, self.shard_size - self.size)
+            for field, array in self.arrays.items():
+                array[self.size : self.size + count] = buffers[field][
+                    start : start + count
+                ]
+            self.size += count
+            start += count
+            if self.size == self.shard_size:
+                self._flush()
+
+    # Flushes the last (partially filled) shard, returns the list of shards written
+    def close(self):
+        if self.arrays is not None:
+            self._flush()
+        return self.shards
+
+
+# Plays a single game, storing its transitions in the preallocated game buffers, returns the number of moves
+def play_game(env, policies, buffers, packed=False):
+    env.reset()
+    last_move = {}
+    n = 0
+    while env.agents:
+        agent = env.agent_selection
+        observation = env.observe(agent)
+        action = policies[agent](observation, agent)
+        env.step(action)
+
+        if packed:
+            buffers["observation"][n] = pack_observations(observation["observation"])
+            buffers["action_mask"][n] = pack_action_masks(observation["action_mask"])
+        else:
+            buffers["observation"][n] = observation["observation"]
+            buffers["action_mask"][n] = observation["action_mask"]
+        buffers["action"][n] = action
+        buffers["reward"][n] = env.rewards[agent]
+        buffers["done"][n] = False
+        buffers["agent"][n] = env.possible_agents.index(agent)
+        last_move[agent] = n
+        n += 1
+
+    # Final rewards are only known once the game is over
+    for agent, i in last_move.items():
+        buffers["reward"][i] = env.rewards[agent]
+        buffers["done"][i] = True
+    return n
+
+
+def _generate_worker(worker_id, num_games, seed, settings):
+    env = raw_env(
+        per_move_rewards=settings["per_move_rewards"],
+        final_reward_score_difference=settings["final_reward_score_difference"],
+    )
+    policy_seeds = seed.spawn(2)
+    policies = {
+        agent: get_policy(name, env, policy_seed)
+        for agent, name, policy_seed in zip(
+            env.possible_agents,
+            [settings["policy"], settings["opponent_policy"]],
+            policy_seeds,
+        )
+    }
+
+    specs = field_specs(env.board.num_actions, settings["packed"])
+    buffers = {
+        field: np.zeros((MAX_GAME_PLIES,) + tuple(shape), dtype=dtype)
+        for field, (shape, dtype) in specs.items()
+    }
+    writer = ShardWriter(
+        settings["output_dir"], f"{worker_id:03d}", specs, settings["shard_size"]
+    )
+    num_transitions = 0
+    for _ in range(num_games):
+        n = play_game(env, policies, buffers, settings["packed"])
+        writer.write(buffers, n)
+        num_transitions += n
+    return writer.close(), num_transitions
+
+
+def _generate_worker_star(args):
+    return _generate_worker(*args)
+
+
+# Generates num_games self-play games into output_dir, returns the manifest (also written to output_dir)
+def generate_dataset(
+    output_dir,
+    num_games,
+    policy="random",
+    opponent_policy=None,
+    shard_size=DEFAULT_SHARD_SIZE,
+    num_workers=1,
+    seed=None,
+    packed=False,
+    per_move_rewards=False,
+    final_reward_score_difference=False,
+):
+    os.makedirs(output_dir, exist_ok=True)
+    settings = {
+        "output_dir": output_dir,
+        "policy": policy,
+        "opponent_policy": opponent_policy or policy,
+        "shard_size": shard_size,
+        "packed": packed,
+        "per_move_rewards": per_move_rewards,
+        "final_reward_score_difference": final_reward_score_difference,
+    }
+    for name in [settings["policy"], settings["opponent_policy"]]:
+        if name not in POLICIES:
+            raise ValueError(
+                f"Unknown policy {name!r}, expected one of {sorted(POLICIES.keys())}"
+            )
+
+    # Games are split evenly between workers, each worker writes its own shards
+    num_workers = max(1, min(num_workers, num_games))
+    worker_seeds = np.random.SeedSequence(seed).spawn(num_workers)
+    jobs = [
+        (
+            worker_id,
+            num_games // num_workers + (worker_id < num_games % num_workers),
+            worker_seeds[worker_id],
+            settings,
+        )
+        for worker_id in range(num_workers)
+    ]
+    if num_workers == 1:
+        results = [_generate_worker_star(jobs[0])]
+    else:
+        with multiprocessing.Pool(num_workers) as pool:
+            results = pool.map(_generate_worker_star, jobs)
+
+    num_actions = raw_env().board.num_actions
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "num_actions": num_actions,
+        "packed": packed,
+        "fields": {
+            field: {"shape": list(shape), "dtype": dtype}
+            for field, (shape, dtype) in field_specs(num_actions, packed).items()
+        },
+        "num_games": num_games,
+        "num_transitions": sum(n for _, n in results),
+        "settings": {k: v for k, v in settings.items() if k != "output_dir"},
+        "seed": seed,
+        "shards": [shard for shards, _ in results for shard in shards],
+    }
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class ShardedDataset:
+    """
+    Random access reader for datasets written by generate_dataset, shards are memory-mapped (not loaded into RAM)
+    Batches are gathered with fancy indexing into reusable output buffers
+    Set unpack=True to return bit-packed observations and action masks as int8 arrays (as returned by observe)
+    """
+
+    def __init__(self, path, unpack=False):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_NAME)) as f:
+            self.manifest = json.load(f)
+        if self.manifest["version"] != MANIFEST_VERSION:
+            raise ValueError(
+                f"Unsupported dataset manifest version {self.manifest['version']}"
+            )
+        self.num_actions = self.manifest["num_actions"]
+        self.packed = self.manifest["packed"]
+        self.unpack = unpack and self.packed
+
+        # Empty shards are skipped, self.offsets[i] is the index of the first transition of shard i
+        shards = [shard for shard in self.manifest["shards"] if shard["size"] > 0]
+        self.shards = [
+            {
+                field: np.load(os.path.join(path, filename), mmap_mode="r")
+                for field, filename in shard["files"].items()
+            }
+            for shard in shards
+        ]
+        sizes = [shard["size"] for shard in shards]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+
+        # Shape and dtype of each field in a batch
+        self.specs = {
+            field: (tuple(spec["shape"]), spec["dtype"])
+            for field, spec in self.manifest["fields"].items()
+        }
+        if self.unpack:
+            self.specs.update(field_specs(self.num_actions, packed=False))
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    # Preallocated output buffers for a batch of the given size (dict of arrays, one per field)
+    def allocate_batch(self, batch_size):
+        return {
+            field: np.zeros((batch_size,) + shape, dtype=dtype)
+            for field, (shape, dtype) in self.specs.items()
+        }
+
+    # Gathers the transitions at the given (global) indices, into out if given (see allocate_batch)
+    def gather(self, indices, out=None):
+        indices = np.asarray(indices, dtype=np.int64)
+        if out is None:
+            out = self.allocate_batch(len(indices))
+        shard_ids = np.searchsorted(self.offsets, indices, side="right") - 1
+        local_indices = indices - self.offsets[shard_ids]
+
+        for shard_id in np.unique(shard_ids):
+            rows = np.flatnonzero(shard_ids == shard_id)
+            local = local_indices[rows]
+            for field, array in self.shards[shard_id].items():
+                if self.unpack and field == "observation":
+                    out[field][rows] = unpack_observations(array[local])
+                elif self.unpack and field == "action_mask":
+                    out[field][rows] = unpack_action_masks(
+                        array[local], self.num_actions
+                    )
+                else:
+                    out[field][rows] = array[local]
+        return out
+
+    # Uniformly random batch of transitions (with replacement)
+    def sample(self, batch_size, rng=None, out=None):
+        rng = rng if rng is not None else np.random.default_rng()
+        return self.gather(rng.integers(0, len(self), size=batch_size), out)
+
+    # Endless iterator over random batches, prepared in a background thread (see BatchPrefetcher)
+    def batches(self, batch_size, seed=None, prefetch=2):
+        return BatchPrefetcher(self, batch_size, seed, prefetch)
+
+
+class BatchPrefetcher:
+    """
+    Samples random batches from a ShardedDataset in a background thread, keeping up to prefetch batches ready
+    Uses prefetch + 1 rotating output buffers: a batch is valid until the next batch is requested
+    An exception raised while sampling stops the thread and is raised again by every later request
+    """
+
+    def __init__(self, dataset, batch_size, seed=None, prefetch=2):
+        self.dataset = dataset
+        self.rng = np.random.default_rng(seed)
+        self.free = queue.Queue()
+        self.ready = queue.Queue()
+        for _ in range(prefetch + 1):
+            self.free.put(dataset.allocate_batch(batch_size))
+        self.batch_size = batch_size
+        self.current = None
+        self.error = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while not self.stopped.is_set():
+                out = self.free.get()
+                if out is None:
+                    break
+                self.ready.put(self.dataset.sample(self.batch_size, self.rng, out))
+        except Exception as e:
+            self.ready.put(e)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.error is not None:
+            raise self.error
+        # The previous batch is no longer in use, its buffers can be refilled
+        if self.current is not None:
+            self.free.put(self.current)
+            self.current = None
+        batch = self.ready.get()
+        if isinstance(batch, Exception):
+            # The thread has stopped after putting the exception, no more batches will be sampled
+            self.error = batch
+            self.thread.join()
+            raise batch
+        self.current = batch
+        return batch
+
+    def close(self):
+        self.stopped.set()
+        self.free.put(None)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Generate a self-play dataset of Cathedral transitions."
+    )
+    parser.add_argument(
+        "--output", type=str, required=True, help="Directory to write shards to."
+    )
+    parser.add_argument(
+        "--games", type=int, default=1000, help="Number of games to play."
+    )
+    parser.add_argument(
+        "--policy",
+        type=str,
+        default="random",
+        choices=sorted(POLICIES.keys()),
+        help="Policy used by player_0 (and player_1 unless --opponent-policy is set).",
+    )
+    parser.add_argument(
+        "--opponent-policy",
+        type=str,
+        default=None,
+        choices=sorted(POLICIES.keys()),
+        help="Policy used by player_1.",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=DEFAULT_SHARD_SIZE,
+        help="Number of transitions per shard.",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of worker processes."
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Set random seed.")
+    parser.add_argument(
+        "--packed",
+        action="store_true",
+        help="Store bit-packed observations and action masks (see game/encoding.py).",
+    )
+    parser.add_argument(
+        "--per-move-rewards",
+        action="store_true",
+        help="Use heuristic per-move rewards.",
+    )
+    parser.add_argument(
+        "--final-reward-score-difference",
+        action="store_true",
+        help="Use the score difference as final reward.",
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    start = time.perf_counter()
+    manifest = generate_dataset(
+        args.output,
+        args.games,
+        policy=args.policy,
+        opponent_policy=args.opponent_policy,
+        shard_size=args.shard_size,
+        num_workers=args.workers,
+        seed=args.seed,
+        packed=args.packed,
+        per_move_rewards=args.per_move_rewards,
+        final_reward_score_difference=args.final_reward_score_difference,
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"Wrote {manifest['num_transitions']} transitions from {manifest['num_games']} games "
+        f"in {len(manifest['shards'])} shards to {args.output} "
+        f"({elapsed:.1f}s, {manifest['num_transitions'] / elapsed:.0f} transitions/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
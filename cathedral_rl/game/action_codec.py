@@ -0,0 +1,98 @@
+import numpy as np
+
+
+class ActionCodec:
+    """
+    Lookup tables mapping flat actions to (piece, x, y, rotation) and back in O(1)
+    Built once from a Board's precalculated actions and shared by every board (tables are read-only)
+    """
+
+    def __init__(self, board):
+        self.possible_agents = board.possible_agents
+        self.num_actions = board.num_actions
+        self.num_pieces = board.num_pieces
+        self.grid_shape = board.action_grid_shape
+
+        # action -> piece, action -> index of the action within the piece's slice of the action range
+        self.pieces = np.repeat(
+            np.arange(board.num_pieces), board.num_actions_per_piece
+        )
+        self.action_nums = (
+            np.arange(self.num_actions) - board.piece_action_offsets[self.pieces]
+        )
+
+        # action -> (x, y) reference position and rotation (degrees), per agent
+        self.positions = {}
+        self.rotations = {}
+        # (piece, rotation // 90, x, y) -> action, -1 if there is no such action
+        self.grid_to_action = {}
+        # Number of pieces each agent owns (player_1 has no cathedral)
+        self.num_agent_pieces = {}
+        for agent in self.possible_agents:
+            _, rotations, xs, ys = np.unravel_index(
+                board.action_grid_index[agent], self.grid_shape
+            )
+            self.positions[agent] = np.stack([xs, ys], axis=1)
+            self.rotations[agent] = rotations * 90
+            self.grid_to_action[agent] = board.grid_to_action[agent]
+            self.num_agent_pieces[agent] = len(board.pieces[agent])
+
+        for table in [
+            self.pieces,
+            self.action_nums,
+            *self.positions.values(),
+            *self.rotations.values(),
+        ]:
+            table.flags.writeable = False
+
+        # Plain lists are faster than numpy arrays for scalar lookups in the env's hot paths
+        self._pieces_list = self.pieces.tolist()
+        self._action_nums_list = self.action_nums.tolist()
+
+    # Scalar action -> (piece, action_num)
+    def piece_and_action_num(self, action):
+        return self._pieces_list[action], self._action_nums_list[action]
+
+    # Batched decode: actions (any shape) -> (pieces, xs, ys, rotations) arrays of the same shape
+    def decode(self, agent, actions):
+        actions = np.asarray(actions)
+        positions = self.positions[agent][actions]
+        return (
+            self.pieces[actions],
+            positions[..., 0],
+            positions[..., 1],
+            self.rotations[agent][actions],
+        )
+
+    # Batched encode: (pieces, xs, ys, rotations) arrays -> actions, -1 where no such action exists
+    def encode(self, agent, pieces, xs, ys, rotations):
+        pieces, xs, ys, rotations = np.broadcast_arrays(
+            np.asarray(pieces), np.asarray(xs), np.asarray(ys), np.asarray(rotations)
+        )
+        valid = (
+            (pieces >= 0)
+            & (pieces < self.num_agent_pieces[agent])
+            & (xs >= 0)
+            & (xs < 10)
+            & (ys >= 0)
+            & (ys < 10)
+            & (rotations >= 0)
+            & (rotations < 360)
+            & (rotations % 90 == 0)
+        )
+        actions = np.full(pieces.shape, -1, dtype=np.int64)
+        actions[valid] = self.grid_to_action[agent][
+            pieces[valid], rotations[valid] // 90, xs[valid], ys[valid]
+        ]
+        return actions
+
+    # Scalar encode, returns -1 if there is no such action
+    def encode_one(self, agent, piece, x, y, rotation):
+        if (
+            0 <= piece < self.num_agent_pieces[agent]
+            and 0 <= x < 10
+            and 0 <= y < 10
+            and rotation in (0, 90, 180, 270)
+        ):
+            return int(self.grid_to_action[agent][piece, rotation // 90, x, y])
+        return -1
@@ -1,9 +1,34 @@
 import numpy as np
 
+from .action_codec import ActionCodec
+from .cache import LRUCache
+from .geometry import PIECE_ROTATIONS
 from .pieces import get_pieces
 
+# Precalculated action tables are identical for every board, so they are computed once per process and shared
+# (treat them as read-only)
+_SHARED_TABLES = {}
+
+
+def _shared_table(key, calculate):
+    if key not in _SHARED_TABLES:
+        _SHARED_TABLES[key] = calculate()
+    return _SHARED_TABLES[key]
+
+
+# Default memory bound of the territory cache shared by all boards in the process
+TERRITORY_CACHE_BYTES = 16 * 1024 * 1024
+
 
 class Board:
+    # Territory of empty squares is a pure function of the occupancy of the board, so flood fill results are
+    # cached across all boards in the process, keyed by packed occupancy (set to None to disable)
+    territory_cache = LRUCache(TERRITORY_CACHE_BYTES)
+
+    # Operation counters (instrumentation.OperationCounters) updated by the territory and legality engines
+    # None disables counting, envs created with operation_counters=True set this on each of their boards
+    counters = None
+
     def __init__(self):
         # 10 rows x 10 columns
         # blank space = 0
@@ -39,6 +64,13 @@ class Board:
             agent: list(np.arange(len(self.pieces[agent])))
             for agent in self.possible_agents
         }
+        # Total size of each agent's unplaced pieces, updated by play_turn and remove (see get_score)
+        self.unplaced_squares = {
+            agent: sum(piece.size for piece in self.pieces[agent])
+            for agent in self.possible_agents
+        }
+        # Territory squares per agent, counted on demand after each territory update (see get_territory_squares)
+        self._territory_squares = None
 
         # Calculate all possible actions and their corresponding positions
         # self.points[agent][piece][action_num] = [(x1, y1), ..., (x5, y5)] for coords (x1,y1), ... (x5, y5)
@@ -55,7 +87,9 @@ class Board:
                 self.positions[agent],
                 self.rotations[agent],
                 self.reverse_actions[agent],
-            ) = self.calculate_possible_actions(agent)
+            ) = _shared_table(
+                ("actions", agent), lambda: self.calculate_possible_actions(agent)
+            )
 
         # Get the total number of actions involving a given piece, using the pre-calculated points dict
         self.num_actions_per_piece = [
@@ -69,6 +103,46 @@ class Board:
         ]
         self.num_actions = sum(self.num_actions_per_piece)
 
+        # First flat action index of each piece's slice of the action range (hierarchical piece -> placement actions)
+        self.piece_action_offsets = np.array([0] + self.piece_indices)
+        self.max_actions_per_piece = max(self.num_actions_per_piece)
+
+        # Spatial action layout (piece, rotation, x, y) for convolutional policies
+        # self.action_grid_index[agent][action] = flat index of the action in the grid
+        # self.grid_to_action[agent][piece, rotation, x, y] = action, or -1 for permanently invalid entries
+        # (placements going off the board, or rotations deduplicated in calculate_possible_actions)
+        self.action_grid_shape = (self.num_pieces, 4, 10, 10)
+        self.action_grid_index = {}
+        self.grid_to_action = {}
+        for agent in self.possible_agents:
+            (
+                self.action_grid_index[agent],
+                self.grid_to_action[agent],
+            ) = _shared_table(
+                ("action_grid", agent), lambda: self.calculate_action_grid(agent)
+            )
+
+        # O(1) lookup tables for action <-> (piece, x, y, rotation), with batched encode/decode
+        self.codec = _shared_table("codec", lambda: ActionCodec(self))
+
+        # Placement masks for has_legal_move: self.placement_squares[agent][piece] = flat indices of the squares
+        # covered by each placement of the piece, shape (num placements, piece size), in action order
+        self.placement_squares = {
+            agent: _shared_table(
+                ("placement_squares", agent),
+                lambda: self.calculate_placement_squares(agent),
+            )
+            for agent in self.possible_agents
+        }
+        # Pieces of each agent from smallest to largest (small pieces are the most likely to still fit)
+        self.pieces_by_size = {
+            agent: sorted(
+                range(len(self.pieces[agent])),
+                key=lambda piece: self.pieces[agent][piece].size,
+            )
+            for agent in self.possible_agents
+        }
+
     def calculate_possible_actions(self, agent):
         points = {}
         positions = {}
@@ -78,45 +152,83 @@ class Board:
             points[piece] = []
             positions[piece] = []
             rotations[piece] = []
+            seen = set()
+            # Precomputed cell offsets of this piece for rotations of 0, 90, 180 and 270 degrees
+            offsets = PIECE_ROTATIONS[self.pieces[agent][piece].label]
             for i in range(10):
                 for j in range(10):
                     for k in range(4):
-                        self.pieces[agent][piece].set_position(i, j)
-                        self.pieces[agent][piece].set_rotation(90 * k)
-                        if np.all(
-                            (np.array(self.pieces[agent][piece].points) >= 0)
-                            & (np.array(self.pieces[agent][piece].points) < 10)
-                        ):
-                            if (
-                                set(self.pieces[agent][piece].points)
-                                not in points[piece]
-                            ):
-                                points[piece].append(
-                                    set(self.pieces[agent][piece].points)
-                                )
-                                positions[piece].append(
-                                    self.pieces[agent][piece].position
-                                )
+                        piece_points = [(i + dx, j + dy) for dx, dy in offsets[k]]
+                        if all(0 <= x < 10 and 0 <= y < 10 for x, y in piece_points):
+                            # Skip rotations which cover the same points as an earlier action
+                            if frozenset(piece_points) not in seen:
+                                seen.add(frozenset(piece_points))
+                                points[piece].append(set(piece_points))
+                                positions[piece].append((i, j))
                                 rotations[piece].append(90 * k)
-                                reverse_actions.append(
-                                    np.array(
-                                        (
-                                            piece,
-                                            self.pieces[agent][piece].position[0],
-                                            self.pieces[agent][piece].position[1],
-                                            90 * k,
-                                        )
-                                    )
-                                )
-
-            # Mark this piece as unplaced (ref point -1, -1)
-            self.pieces[agent][piece].set_unplaced()
-
-            # Reset rotation for consistency
-            self.pieces[agent][piece].set_rotation(0)
+                                reverse_actions.append(np.array((piece, i, j, 90 * k)))
 
         return points, positions, rotations, np.array(reverse_actions)
 
+    def calculate_placement_squares(self, agent):
+        placement_squares = {}
+        for piece, piece_points in self.points[agent].items():
+            placement_squares[piece] = np.array(
+                [sorted(10 * x + y for x, y in points) for points in piece_points],
+                dtype=np.int64,
+            )
+            placement_squares[piece].flags.writeable = False
+        return placement_squares
+
+    def calculate_action_grid(self, agent):
+        action_grid_index = np.zeros(self.num_actions, dtype=np.int64)
+        for piece in range(self.num_pieces):
+            # Actions for pieces this agent does not own (e.g., the cathedral) use the other agent's layout
+            owner = agent if piece in self.positions[agent] else self.possible_agents[0]
+            start = self.piece_action_offsets[piece]
+            positions = np.array(self.positions[owner][piece], dtype=np.int64)
+            rotations = np.array(self.rotations[owner][piece], dtype=np.int64) // 90
+            action_grid_index[start : start + len(positions)] = np.ravel_multi_index(
+                (
+                    np.full(len(positions), piece),
+                    rotations,
+                    positions[:, 0],
+                    positions[:, 1],
+                ),
+                self.action_grid_shape,
+            )
+        grid_to_action = np.full(self.action_grid_shape, -1, dtype=np.int64)
+        grid_to_action.reshape(-1)[action_grid_index] = np.arange(self.num_actions)
+        action_grid_index.flags.writeable = False
+        grid_to_action.flags.writeable = False
+        return action_grid_index, grid_to_action
+
+    # Maps flat actions (scalar or array) to (piece, rotation, x, y) grid coordinates
+    def flat_to_grid(self, agent, action):
+        return np.unravel_index(
+            self.action_grid_index[agent][action], self.action_grid_shape
+        )
+
+    # Maps grid coordinates (scalars or arrays) back to flat actions, -1 for invalid grid entries
+    def grid_to_flat(self, agent, piece, rotation, x, y):
+        return self.grid_to_action[agent][piece, rotation, x, y]
+
+    # Scatters a flat action mask (..., num_actions) into the spatial layout (..., num_pieces, 4, 10, 10)
+    def action_mask_to_grid(self, agent, action_mask):
+        action_mask = np.asarray(action_mask)
+        batch_shape = action_mask.shape[:-1]
+        grid = np.zeros(
+            batch_shape + (np.prod(self.action_grid_shape),), action_mask.dtype
+        )
+        grid[..., self.action_grid_index[agent]] = action_mask
+        return grid.reshape(batch_shape + self.action_grid_shape)
+
+    # Gathers a spatial layout (..., num_pieces, 4, 10, 10) (e.g., policy logits) into flat actions (..., num_actions)
+    def grid_to_action_mask(self, agent, grid):
+        grid = np.asarray(grid)
+        batch_shape = grid.shape[: grid.ndim - len(self.action_grid_shape)]
+        return grid.reshape(batch_shape + (-1,))[..., self.action_grid_index[agent]]
+
     def check_territory(self, agent):
         self.previous_territory = self.territory.copy()
         piece_removed_size = 0
@@ -131,9 +243,12 @@ class Board:
         ]
         if agent == "player_0" and self.pieces["player_0"][14].is_placed():
             placed_pieces.append((self.pieces[agent][14], agent, 14))
+        if self.counters is not None:
+            self.counters.check_territory_calls += 1
+            self.counters.pieces_probed += len(placed_pieces)
 
         # Look through opponent pieces (and the cathedral) and try removing them
-        for (piece, piece_agent, piece_idx) in placed_pieces:
+        for piece, piece_agent, piece_idx in placed_pieces:
             self.squares = squares_real.copy()  # Reset self.squares to original state
             for coord in piece.points:
                 self.squares.reshape(10, 10)[coord[0], coord[1]] = 0
@@ -167,24 +282,63 @@ class Board:
         return territory_claimed, piece_removed_size
 
     def get_territory(self):
+        self._territory_squares = None
+
         # Reset illegal territory from previous calculations
         self.territory[self.territory < 0] = 0
-        self.empty_spaces = [
-            (i, j)
-            for i in range(10)
-            for j in range(10)
-            if self.squares.reshape(10, 10)[i, j] == 0
-        ]
-        while self.empty_spaces:
-            # pick a random empty place
-            empty_space_seed = next(iter(self.empty_spaces))
-            self.remove_empty_spaces(empty_space_seed)
+
+        key = self.occupancy_key() if self.territory_cache is not None else None
+        cached = self.territory_cache.get(key) if key is not None else None
+        if self.counters is not None:
+            self.counters.get_territory_calls += 1
+            self.counters.territory_cache_hits += cached is not None
+        if cached is not None:
+            # Only empty squares are assigned territory (squares under pieces keep their previous values)
+            empty = self.squares == 0
+            self.territory[empty] = cached[empty]
+            self.empty_spaces = []
+        else:
+            self.empty_spaces = [
+                (i, j)
+                for i in range(10)
+                for j in range(10)
+                if self.squares.reshape(10, 10)[i, j] == 0
+            ]
+            while self.empty_spaces:
+                # pick a random empty place
+                empty_space_seed = next(iter(self.empty_spaces))
+                self.remove_empty_spaces(empty_space_seed)
+
+            if key is not None:
+                self.territory_cache.put(key, self.territory.astype(np.float32))
 
         territory_claimed = len(self.territory[self.territory > 0]) - len(
             self.previous_territory[self.previous_territory > 0]
         )
         return territory_claimed
 
+    # Number of territory squares of each agent: {agent: squares}
+    # Squares under pieces keep the territory value they had when the piece was placed, and are counted too
+    def get_territory_squares(self):
+        if self._territory_squares is None:
+            self._territory_squares = {
+                agent: int(np.count_nonzero(self.territory == i + 1))
+                for i, agent in enumerate(self.possible_agents)
+            }
+        return self._territory_squares
+
+    # Occupancy of the board packed into 25 bytes (2 bits per square), None if the board contains previews
+    def occupancy_key(self):
+        squares = self.squares.astype(np.uint8)
+        if squares.max() > 3:
+            return None
+        return (
+            squares[0::4]
+            | (squares[1::4] << 2)
+            | (squares[2::4] << 4)
+            | (squares[3::4] << 6)
+        ).tobytes()
+
     def remove_empty_spaces(self, coordinates):
         queue = [coordinates]
         bordering_pieces = {1: [], 2: [], 3: []}
@@ -282,19 +436,27 @@ class Board:
             elif len(bordering_pieces[2]) > 0:
                 return_val = 2
 
+        if self.counters is not None:
+            self.counters.flood_fills += 1
+            self.counters.flood_fill_cells += len(visited)
+
         for coord in territory:
             self.territory.reshape(10, 10)[coord] = return_val
         return return_val
 
     # Maps an action to its corresponding piece
     def action_to_piece_map(self, action):
-        # Bin the action according to number of possible actions for each piece (e.g., first 100 actions are piece 0)
-        piece = np.digitize(action, self.piece_indices)
+        # Returns the piece and the position of the action in that piece's bin (e.g., action 199 is position 99 in bin 1)
+        return self.codec.piece_and_action_num(action)
 
-        # Get the position of the action in the bin (e.g., action 199 is position 99 in bin 1)
-        action_num = action - self.piece_indices[piece - 1] if piece > 0 else action
+    # Maps a flat action to (piece, placement), where placement indexes the piece's slice of the action range
+    # Accepts scalars or arrays of actions, inverse of hierarchical_to_flat
+    def flat_to_hierarchical(self, action):
+        return self.codec.pieces[action], self.codec.action_nums[action]
 
-        return piece, action_num
+    # Maps (piece, placement) back to the flat action index, accepts scalars or arrays
+    def hierarchical_to_flat(self, piece, placement):
+        return self.piece_action_offsets[piece] + placement
 
     # Helper function for debugging
     def action_to_pos_rotation_mapp(self, agent, action):
@@ -304,27 +466,29 @@ class Board:
         return pos, rotation
 
     # Used by manual policy: allows user to select an action visually
+    # Returns -1 if there is no action for this piece, position and rotation
     def reverse_action_map(self, agent, piece, pos, rotation):
-        try:
-            return np.where(
-                (self.reverse_actions[agent].T[0] == piece)
-                * (self.reverse_actions[agent].T[1] == pos[0])
-                * (self.reverse_actions[agent].T[2] == pos[1])
-                * (self.reverse_actions[agent].T[3] == rotation)
-            )[0][0]
-        except IndexError:
-            return -1
+        return self.codec.encode_one(agent, piece, pos[0], pos[1], rotation)
 
     def is_legal(self, agent, action):
         piece, action_num = self.action_to_piece_map(action)
+        counters = self.counters
+        if counters is not None:
+            counters.is_legal_calls += 1
 
         # If the cathedral has not been played, make all other moves illegal
         if self.CATHEDRAL_INDEX in self.unplaced_pieces[agent]:
             if piece != self.CATHEDRAL_INDEX:
+                if counters is not None:
+                    counters.is_legal_early_rejections += 1
+                    counters.is_legal_rejections += 1
                 return False
 
         # If a piece has already been placed, mark it as an illegal moves
         if piece not in self.unplaced_pieces[agent]:
+            if counters is not None:
+                counters.is_legal_early_rejections += 1
+                counters.is_legal_rejections += 1
             return False
 
         # Get the coordinate points which this piece occupies
@@ -336,12 +500,51 @@ class Board:
         for coord in points:
             # If the spot is occupied by a player's piece or the cathedral, this move is illegal
             if self.squares.reshape(10, 10)[coord[0], coord[1]] in [1, 2, 3]:
+                if counters is not None:
+                    counters.is_legal_rejections += 1
                 return False
             # Check if territory belongs to other player (player_1 territory: 1, player_2 territory: 2)
             if self.territory.reshape(10, 10)[coord[0], coord[1]] == opponent_idx + 1:
+                if counters is not None:
+                    counters.is_legal_rejections += 1
                 return False
         return True
 
+    # Whether the agent has at least one legal move (same rules as is_legal), without listing every legal move
+    # Pieces are checked one at a time against a mask of blocked squares, stopping at the first legal placement
+    def has_legal_move(self, agent):
+        counters = self.counters
+        if counters is not None:
+            counters.has_legal_move_calls += 1
+
+        # If the cathedral has not been played, it is the only piece which can be placed
+        unplaced_pieces = self.unplaced_pieces[agent]
+        if self.CATHEDRAL_INDEX in unplaced_pieces:
+            pieces = [self.CATHEDRAL_INDEX]
+        else:
+            pieces = [
+                piece
+                for piece in self.pieces_by_size[agent]
+                if piece in unplaced_pieces
+            ]
+
+        # Squares occupied by a player's piece or the cathedral, or in the other player's territory
+        opponent_idx = 1 - self.possible_agents.index(agent)
+        squares = self.squares
+        blocked = (
+            (squares == 1)
+            | (squares == 2)
+            | (squares == 3)
+            | (self.territory == opponent_idx + 1)
+        )
+
+        for piece in pieces:
+            if counters is not None:
+                counters.has_legal_move_pieces_scanned += 1
+            if not blocked[self.placement_squares[agent][piece]].any(axis=1).all():
+                return True
+        return False
+
     def play_turn(self, agent, action):
         piece_idx, action_num = self.action_to_piece_map(action)
         rotation = self.rotations[agent][piece_idx][action_num]
@@ -355,20 +558,21 @@ class Board:
 
         # Update the piece object's position (we can use this to access the points it occupies)
         piece = self.pieces[agent][piece_idx]
+        self.unplaced_squares[agent] -= piece.size
 
         # Split tuple (x, y) into inputs x, y
         piece.set_position(position[0], position[1])
         piece.set_rotation(rotation)
         piece.set_placed()
 
-        for coord in points:
-            if piece_idx == self.CATHEDRAL_INDEX:
-                # Cathedral is neither team's piece
-                self.squares.reshape(10, 10)[coord[0], coord[1]] = 3
-            elif self.possible_agents.index(agent) == 0:
-                self.squares.reshape(10, 10)[coord[0], coord[1]] = 1
-            elif self.possible_agents.index(agent) == 1:
-                self.squares.reshape(10, 10)[coord[0], coord[1]] = 2
+        if piece_idx == self.CATHEDRAL_INDEX:
+            value = 3  # Cathedral is neither team's piece
+        else:
+            value = self.possible_agents.index(agent) + 1
+
+        # Index the flat (row major) board directly, avoids creating a reshaped view per square
+        for x, y in points:
+            self.squares[10 * x + y] = value
         return piece.size
 
     def preview_turn(self, agent, action):
@@ -403,15 +607,106 @@ class Board:
                     "Trying to remove a piece which is already in the list of unplaced pieces"
                 )
             self.unplaced_pieces[agent].append(piece_idx)
+            self.unplaced_squares[agent] += piece.size
 
         # Mark positions on board as empty
-        for coord in piece.points:
-            self.squares.reshape(10, 10)[coord[0], coord[1]] = 0
+        for x, y in piece.points:
+            self.squares[10 * x + y] = 0
 
         # Reset piece position
         piece.set_unplaced()
         piece.set_rotation(0)
 
+    # Serializable snapshot of the mutable game state (board planes, piece placements and unplaced pieces)
+    # pieces[agent][piece_idx] = [x, y, rotation, placed] for the reference point of each piece
+    def get_state(self):
+        return {
+            "squares": self.squares.copy(),
+            "territory": self.territory.copy(),
+            "pieces": {
+                agent: [
+                    [*piece.position, piece.rotation, int(piece.placed)]
+                    for piece in self.pieces[agent]
+                ]
+                for agent in self.possible_agents
+            },
+            "unplaced_pieces": {
+                agent: [int(piece) for piece in self.unplaced_pieces[agent]]
+                for agent in self.possible_agents
+            },
+        }
+
+    # Restores a snapshot from get_state (precalculated action tables are shared, so nothing is recalculated)
+    def set_state(self, state):
+        self.squares = np.array(state["squares"], dtype=float).reshape(100)
+        self.territory = np.array(state["territory"], dtype=float).reshape(100)
+        for agent in self.possible_agents:
+            for piece, (x, y, rotation, placed) in zip(
+                self.pieces[agent], state["pieces"][agent]
+            ):
+                piece.set_position(x, y)
+                piece.set_rotation(rotation)
+                piece.placed = bool(placed)
+            self.unplaced_pieces[agent] = list(state["unplaced_pieces"][agent])
+            self.unplaced_squares[agent] = sum(
+                self.pieces[agent][piece].size for piece in self.unplaced_pieces[agent]
+            )
+        self._territory_squares = None
+
+    # Pickles only the state of get_state, packed into bytes: one byte per square (square value 0-9 in the low
+    # nibble, territory -1-2 stored as 0-3 in the high nibble, NaN territory as 4) and int8 piece coordinates and
+    # quarter turns
+    # The action tables and Piece objects are rebuilt by __init__ (action tables are shared per process)
+    def __getstate__(self):
+        territory = np.nan_to_num(self.territory + 1, nan=4).astype(np.uint8)
+        squares = self.squares.astype(np.uint8) | (territory << 4)
+        pieces = [
+            [*piece.position, piece.rotation // 90, int(piece.placed)]
+            for agent in self.possible_agents
+            for piece in self.pieces[agent]
+        ]
+        return (
+            squares.tobytes(),
+            np.array(pieces, dtype=np.int8).tobytes(),
+            tuple(
+                bytes(int(piece) for piece in self.unplaced_pieces[agent])
+                for agent in self.possible_agents
+            ),
+            # Counters set on this board (the class level default is not pickled)
+            self.__dict__.get("counters"),
+        )
+
+    def __setstate__(self, state):
+        self.__init__()
+        squares, pieces, unplaced_pieces, counters = state
+        squares = np.frombuffer(squares, dtype=np.uint8)
+        territory = (squares >> 4).astype(float) - 1
+        territory[territory == 3] = np.nan
+        pieces = np.frombuffer(pieces, dtype=np.int8).reshape(-1, 4).tolist()
+        num_pieces_0 = len(self.pieces[self.possible_agents[0]])
+        self.set_state(
+            {
+                "squares": squares & 15,
+                "territory": territory,
+                "pieces": {
+                    agent: [
+                        [x, y, 90 * turns, placed]
+                        for x, y, turns, placed in agent_pieces
+                    ]
+                    for agent, agent_pieces in zip(
+                        self.possible_agents,
+                        [pieces[:num_pieces_0], pieces[num_pieces_0:]],
+                    )
+                },
+                "unplaced_pieces": {
+                    agent: list(unplaced)
+                    for agent, unplaced in zip(self.possible_agents, unplaced_pieces)
+                },
+            }
+        )
+        if counters is not None:
+            self.counters = counters
+
     # returns:
     # -1 for no winner
     # 0 -- agent 0 wins
@@ -432,13 +727,14 @@ class Board:
 
     # Returns list of pieces remaining and total number of points occupied by those pieces (piece score)
     def get_score(self):
-        piece_score = {agent: 0 for agent in self.possible_agents}
-        pieces_remaining = {agent: [] for agent in self.possible_agents}
-        for agent in self.possible_agents:
-            for piece_idx in self.unplaced_pieces[agent]:
-                piece_score[agent] += self.pieces[agent][piece_idx].size
-                pieces_remaining[agent].append(self.pieces[agent][piece_idx])
-        return pieces_remaining, piece_score
+        pieces_remaining = {
+            agent: [
+                self.pieces[agent][piece_idx]
+                for piece_idx in self.unplaced_pieces[agent]
+            ]
+            for agent in self.possible_agents
+        }
+        return pieces_remaining, dict(self.unplaced_squares)
 
     def __str__(self):
         return str(self.squares.reshape(10, 10).T)  # Lines up with pygame rendering
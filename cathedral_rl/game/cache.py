@@ -0,0 +1,87 @@
+from collections import OrderedDict
+
+# Approximate bookkeeping overhead per cache entry (dict slot, key object, value tuple), in bytes
+ENTRY_OVERHEAD = 200
+
+
+class LRUCache:
+    """
+    Memory-bounded least-recently-used cache with hit/miss/eviction counters
+    Entry sizes are estimated from the numpy arrays and bytes objects they store
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    # Returns the cached value (marking it as most recently used), or None on a miss
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if key in self.entries:
+            self._pop(key)
+        size = entry_size(key) + entry_size(value) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        self.entries[key] = value
+        self.sizes[key] = size
+        self.num_bytes += size
+        # Evict least recently used entries until the cache fits in its memory bound
+        while self.num_bytes > self.max_bytes:
+            self._pop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _pop(self, key):
+        del self.entries[key]
+        self.num_bytes -= self.sizes.pop(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.sizes.clear()
+        self.num_bytes = 0
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.num_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Estimated size in bytes of a cached key or value (numpy arrays, bytes, ints, or tuples of those)
+def entry_size(obj):
+    if isinstance(obj, tuple):
+        return sum(entry_size(item) for item in obj)
+    if hasattr(obj, "nbytes"):
+        return obj.nbytes
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    return 8
@@ -68,27 +68,153 @@ from typing import Optional
 
 import gymnasium
 import numpy as np
-import pygame
 from gymnasium import spaces
 from pettingzoo import AECEnv
 from pettingzoo.utils import wrappers
 from pettingzoo.utils.agent_selector import agent_selector
+from pettingzoo.utils.env_logger import EnvLogger
+from pettingzoo.utils.wrappers.order_enforcing import AECOrderEnforcingIterable
 
 from .board import Board
+from .cache import LRUCache
+from .encoding import PACKED_OBSERVATION_SIZE, pack_observation_dict, packed_mask_size
+from .instrumentation import OperationCounters, StepTimer
+from .symmetry import canonical_form, get_symmetry_tables, hash_key
+
+
+# Pixels within width of the edge of a block_size x block_size square (borders drawn inside the square, as pygame does)
+def _border_mask(block_size, width):
+    distance = np.minimum(np.arange(block_size), np.arange(block_size)[::-1])
+    return (distance[:, None] < width) | (distance[None, :] < width)
+
+
+# Calculate score heuristic: squares/turn + difference between total squares remaining + difference in territory
+# Score will be positive if agent has placed more large pieces, or claimed more territory
+# Updates score (a dict of score dicts per agent, as in raw_env.score) in place
+def update_score(score, board, turns, agents):
+    # Total size of unplaced pieces per agent (tracked incrementally by the board)
+    unplaced = board.unplaced_squares
+
+    # Difference between average size of pieces placed per turn: agent avg size per turn - opponent avg size per turn
+    # Positive if agent has placed larger pieces per turn on average
+    if turns[agents[0]] != 0:
+        total = board.total_piece_squares
+        avg_agent_0 = (total - unplaced[agents[0]]) / turns[agents[0]]
+        avg_agent_1 = (total - unplaced[agents[1]]) / turns[agents[1]]
+        # score[agents[0]]["squares_per_turn"] = avg_agent_0 - avg_agent_1
+        # score[agents[1]]["squares_per_turn"] = avg_agent_1 - avg_agent_0
+        score[agents[0]]["squares_per_turn"] = avg_agent_0
+        score[agents[1]]["squares_per_turn"] = avg_agent_1
+
+    # Difference between number of total squares remaining (opponent squares remaining - agent squares remaining)
+    # Positive if the opponent has more total squares remaining (penalizes pieces being captured)
+    score[agents[0]]["remaining_pieces"] = unplaced[agents[1]] - unplaced[agents[0]]
+    score[agents[1]]["remaining_pieces"] = unplaced[agents[0]] - unplaced[agents[1]]
+
+    # Difference in territory (agent's total territory - opponent's total territory)
+    # Positive if the opponent has less total territory claimed
+    territory = board.get_territory_squares()
+    score[agents[0]]["territory"] = territory[agents[0]] - territory[agents[1]]
+    score[agents[1]]["territory"] = territory[agents[1]] - territory[agents[0]]
+
+    for i in range(2):
+        score[agents[i]]["total"] = (
+            score[agents[i]]["squares_per_turn"]
+            + score[agents[i]]["remaining_pieces"]
+            + score[agents[i]]["territory"]
+        )
 
 
-def env(render_mode=None, per_move_rewards=False, final_reward_score_difference=False):
+def env(
+    render_mode=None,
+    per_move_rewards=False,
+    final_reward_score_difference=False,
+    hierarchical_actions=False,
+    legal_move_cache_bytes=None,
+    step_timing=False,
+    operation_counters=False,
+):
     env = raw_env(
         render_mode=render_mode,
         per_move_rewards=per_move_rewards,
         final_reward_score_difference=final_reward_score_difference,
+        hierarchical_actions=hierarchical_actions,
+        legal_move_cache_bytes=legal_move_cache_bytes,
+        step_timing=step_timing,
+        operation_counters=operation_counters,
     )
+    return _wrap(env)
+
+
+def _wrap(env):
     env = wrappers.TerminateIllegalWrapper(env, illegal_reward=-1)
     env = wrappers.AssertOutOfBoundsWrapper(env)
-    env = wrappers.OrderEnforcingWrapper(env)
+    env = OrderEnforcingWrapper(env)
+    return env
+
+
+# Attributes which pettingzoo wrappers copy from the env they wrap (the same objects, unless a wrapper ends the game)
+_WRAPPER_SHARED_ATTRIBUTES = (
+    "possible_agents",
+    "metadata",
+    "agent_selection",
+    "rewards",
+    "terminations",
+    "truncations",
+    "infos",
+    "agents",
+    "_cumulative_rewards",
+    "state_space",
+)
+_NOT_SET = object()
+
+
+# Attributes of a wrapper layer: a bit mask of the attributes shared with the wrapped env (relinked when unpickling)
+# and values of the others (order enforcement flags, state of a game ended by an illegal move)
+def _wrapper_state(wrapper):
+    shared, own = 0, {}
+    for name, value in wrapper.__dict__.items():
+        if name == "env":
+            continue
+        if name == "_prev_obs":
+            # Observation cached by TerminateIllegalWrapper, step() observes again when it is None
+            own[name] = None
+        elif name in _WRAPPER_SHARED_ATTRIBUTES and value is getattr(
+            wrapper.env, name, _NOT_SET
+        ):
+            shared |= 1 << _WRAPPER_SHARED_ATTRIBUTES.index(name)
+        else:
+            own[name] = value
+    return shared, own
+
+
+# Rebuilds the wrappers of env() around an unpickled raw_env, innermost layer first
+def _unpickle_wrapped_env(raw, layer_states):
+    env = _wrap(raw)
+    layers = [env, env.env, env.env.env]
+    for layer, (shared, own) in reversed(list(zip(layers, layer_states))):
+        for i, name in enumerate(_WRAPPER_SHARED_ATTRIBUTES):
+            if shared >> i & 1:
+                layer.__dict__[name] = getattr(layer.env, name)
+        layer.__dict__.update(own)
     return env
 
 
+class OrderEnforcingWrapper(wrappers.OrderEnforcingWrapper):
+    """
+    Outer wrapper of env(): pickles as the compact state of the raw env (see raw_env.__getstate__) plus the wrapper
+    attributes which are not shared with it, rather than every wrapper's copy of the game state
+    A mid-game env() pickles to under 1 KB, about 150 B more than the raw env
+    """
+
+    def __reduce__(self):
+        layers = [self, self.env, self.env.env]
+        return _unpickle_wrapped_env, (
+            self.unwrapped,
+            tuple(_wrapper_state(layer) for layer in layers),
+        )
+
+
 class raw_env(AECEnv):
     metadata = {
         "render_modes": ["human", "rgb_array"],
@@ -103,12 +229,26 @@ class raw_env(AECEnv):
         render_mode=None,
         per_move_rewards: Optional[bool] = False,
         final_reward_score_difference: Optional[bool] = False,
+        hierarchical_actions: Optional[bool] = False,
+        legal_move_cache_bytes: Optional[int] = None,
+        step_timing: Optional[bool] = False,
+        operation_counters: Optional[bool] = False,
     ):
-
         super().__init__()
         self.screen = None
         self.render_mode = render_mode
 
+        # Constructor options, used to rebuild the env when unpickling (see __getstate__)
+        self._options = {
+            "render_mode": render_mode,
+            "per_move_rewards": per_move_rewards,
+            "final_reward_score_difference": final_reward_score_difference,
+            "hierarchical_actions": hierarchical_actions,
+            "legal_move_cache_bytes": legal_move_cache_bytes,
+            "step_timing": step_timing,
+            "operation_counters": operation_counters,
+        }
+
         # Enable to set per-move rewards as heuristic score of how good a move is (used by simple greedy agent)
         self.per_move_rewards = per_move_rewards
 
@@ -116,8 +256,33 @@ class raw_env(AECEnv):
         # Useful for testing score-based vs winrate-based optimization (
         self.final_reward_score_difference = final_reward_score_difference
 
-        # Pygame setup
+        # Enable to add a per-piece mask to observations for two-level (piece -> placement) action selection
+        # Policies choose a piece using "piece_mask", then a placement using placement_mask(agent, piece)
+        # Flat actions are still used for step(): convert with board.hierarchical_to_flat(piece, placement)
+        self.hierarchical_actions = hierarchical_actions
+
+        # Set a memory bound (in bytes) to cache legal moves of positions which were already seen
+        # Keyed by the canonical position hash (including side to move), see symmetry.canonical_form
+        # Hit/miss counters are available from self.legal_move_cache.stats()
+        self.legal_move_cache = (
+            LRUCache(legal_move_cache_bytes) if legal_move_cache_bytes else None
+        )
+        self._symmetry_tables = (
+            get_symmetry_tables() if legal_move_cache_bytes else None
+        )
+
+        # Enable to time each phase of step() (is_legal, play_turn, check_territory, score, legal moves, ...)
+        # Last step and cumulative timings (seconds) are added to infos[agent]["step_timing"], see step_timing_stats()
+        self.step_timer = StepTimer() if step_timing else None
+
+        # Enable to count the work done by the board (is_legal calls, pieces probed, flood fill cells, ...)
+        # Counts accumulate across resets, see instrumentation.OperationCounters and aggregate_counters
+        self.operation_counters = OperationCounters() if operation_counters else None
+
+        # Pygame setup (pygame is only imported when rendering to a window, keeping startup fast for headless workers)
         if render_mode == "human":
+            import pygame
+
             pygame.init()
             self.clock = pygame.time.Clock
             self.WINDOW_WIDTH = 1000
@@ -127,8 +292,40 @@ class raw_env(AECEnv):
             )
             self.clock = pygame.time.Clock()
             self.WINDOW_WIDTH, self.WINDOW_HEIGHT = self.window.get_size()
+            # Square colors (as keys of self.colors) drawn by the last render, to only redraw squares which changed
+            self._drawn_values = None
+
+        # rgb_array frames are drawn with NumPy (no pygame), at half the size of the window
+        elif render_mode == "rgb_array":
+            self.WINDOW_WIDTH = 500
+            self.WINDOW_HEIGHT = 500
+            block_size = int(self.WINDOW_WIDTH / 10)
+            self._rgb_array_borders = {
+                width: np.tile(_border_mask(block_size, width), (10, 10))
+                for width in (1, 2)
+            }
+            # Last rendered frame and the board it was rendered from (frames are only redrawn when the board changes)
+            self._rgb_array_frame = None
+            self._rgb_array_key = None
+
+        # Square colors: empty, player_0, player_1, cathedral, player_0 and player_1 territory, 6 is unused,
+        # then previews of player_0, player_1 and cathedral pieces (squares + 6)
+        self.colors = {
+            0: (211, 211, 211),
+            1: (221, 186, 151),
+            2: (120, 65, 65),
+            3: (128, 128, 162),
+            4: (238, 221, 203),
+            5: (188, 160, 160),
+            6: (0, 0, 0),
+            7: (233, 210, 187),
+            8: (208, 189, 189),
+            9: (172, 172, 195),
+        }  # old cathedral preview color (192,221,208)
+        self.border_color = (0, 0, 0)
 
         self.board = Board()
+        self.board.counters = self.operation_counters
 
         self.agents = ["player_0", "player_1"]
         self.possible_agents = self.agents[:]
@@ -145,6 +342,62 @@ class raw_env(AECEnv):
                     "action_mask": spaces.Box(
                         low=0, high=1, shape=(self.board.num_actions,), dtype=np.int8
                     ),
+                    **(
+                        {
+                            "piece_mask": spaces.Box(
+                                low=0,
+                                high=1,
+                                shape=(self.board.num_pieces,),
+                                dtype=np.int8,
+                            )
+                        }
+                        if self.hierarchical_actions
+                        else {}
+                    ),
+                }
+            )
+            for i in self.agents
+        }
+        # Action spaces for two-level action selection: piece, then placement within that piece's slice
+        self.piece_action_space = spaces.Discrete(self.board.num_pieces)
+        self.placement_action_spaces = [
+            spaces.Discrete(n) for n in self.board.num_actions_per_piece
+        ]
+
+        # Spatial action mask returned for agents other than the one whose turn it is
+        self._empty_action_mask_grid = np.zeros(
+            self.board.action_grid_shape, dtype=np.int8
+        )
+        self._empty_action_mask_grid.flags.writeable = False
+
+        # Spaces for bit-packed observations (see observe_packed)
+        self.packed_observation_spaces = {
+            i: spaces.Dict(
+                {
+                    "observation": spaces.Box(
+                        low=0,
+                        high=255,
+                        shape=(PACKED_OBSERVATION_SIZE,),
+                        dtype=np.uint8,
+                    ),
+                    "action_mask": spaces.Box(
+                        low=0,
+                        high=255,
+                        shape=(packed_mask_size(self.board.num_actions),),
+                        dtype=np.uint8,
+                    ),
+                    **(
+                        {
+                            "piece_mask": spaces.Box(
+                                low=0,
+                                high=255,
+                                shape=(packed_mask_size(self.board.num_pieces),),
+                                dtype=np.uint8,
+                            )
+                        }
+                        if self.hierarchical_actions
+                        else {}
+                    ),
                 }
             )
             for i in self.agents
@@ -185,7 +438,7 @@ class raw_env(AECEnv):
 
         observation = np.stack(layers, axis=2).astype(np.int8)
 
-        # If this is the first observation, calculate legal moves, otherwise this is done every step
+        # Legal moves are calculated on the first observation after each step
         if len(self.legal_moves[agent]) == 0:
             self._calculate_legal_moves(agent)
 
@@ -196,8 +449,59 @@ class raw_env(AECEnv):
             if i in legal_moves:
                 action_mask[i] = 1
 
+        if self.hierarchical_actions:
+            return {
+                "observation": observation,
+                "action_mask": action_mask,
+                "piece_mask": self.piece_mask(agent),
+            }
         return {"observation": observation, "action_mask": action_mask}
 
+    # First level of hierarchical actions: mask over pieces with at least one legal placement
+    def piece_mask(self, agent):
+        piece_mask = np.zeros(self.board.num_pieces, dtype=np.int8)
+        if agent == self.agent_selection:
+            if len(self.legal_moves[agent]) == 0:
+                self._calculate_legal_moves(agent)
+            piece_mask[self.legal_pieces[agent]] = 1
+        return piece_mask
+
+    # Second level of hierarchical actions: mask over placements of a single piece (its slice of the flat mask)
+    def placement_mask(self, agent, piece):
+        start = self.board.piece_action_offsets[piece]
+        placement_mask = np.zeros(
+            self.board.num_actions_per_piece[piece], dtype=np.int8
+        )
+        if agent == self.agent_selection:
+            if len(self.legal_moves[agent]) == 0:
+                self._calculate_legal_moves(agent)
+            legal_moves = np.asarray(self.legal_moves[agent], dtype=np.int64)
+            legal_moves = legal_moves[
+                (legal_moves >= start) & (legal_moves < start + len(placement_mask))
+            ]
+            placement_mask[legal_moves - start] = 1
+        return placement_mask
+
+    # Legal action mask in the spatial (num_pieces, 4, 10, 10) layout of board.action_grid_shape
+    # Returns the env's internal buffer (no copy), which is overwritten when legal moves are recalculated
+    # Grid entries with board.grid_to_action[agent] == -1 are permanently invalid
+    def action_mask_grid(self, agent):
+        if agent != self.agent_selection:
+            return self._empty_action_mask_grid
+        if len(self.legal_moves[agent]) == 0:
+            self._calculate_legal_moves(agent)
+        return self.action_mask_grids[agent]
+
+    @functools.lru_cache(maxsize=None)
+    def placement_action_space(self, piece):
+        return self.placement_action_spaces[piece]
+
+    # Bit-packed observation for replay buffers: planes and action mask stored as np.packbits bytes (~8x smaller)
+    # Use encoding.unpack_observation_dict (or the batched helpers in encoding.py) to recover observe() outputs
+    # With hierarchical_actions the piece mask is packed too: pass num_pieces=board.num_pieces when unpacking
+    def observe_packed(self, agent):
+        return pack_observation_dict(self.observe(agent))
+
     # this cache ensures that same space object is returned for the same agent
     # allows action space seeding to work as expected
     @functools.lru_cache(maxsize=None)
@@ -208,20 +512,56 @@ class raw_env(AECEnv):
     def action_space(self, agent):
         return self.action_spaces[agent]
 
+    @functools.lru_cache(maxsize=None)
+    def packed_observation_space(self, agent):
+        return self.packed_observation_spaces[agent]
+
     # Calculate the number of legal moves per agent, legal moves per piece, and legal pieces to be played
     def _calculate_legal_moves(self, agent):
-        legal_moves = []
-        self.legal_moves_per_piece[agent] = np.zeros(self.board.num_pieces)
-
-        for act in range(self.board.num_actions):
-            if self.board.is_legal(agent, act):
-                legal_moves.append(act)
-                self.legal_moves_per_piece[agent][
-                    self.board.action_to_piece_map(act)[0]
-                ] += 1
+        cached = None
+        if self.legal_move_cache is not None:
+            position, symmetry = canonical_form(
+                self.board, agent, self._symmetry_tables
+            )
+            cache_key = hash_key(position)
+            cached = self.legal_move_cache.get(cache_key)
+
+        if cached is not None:
+            # Cached legal moves are stored for the canonical variant of the position, map them back
+            canonical_moves, legal_moves_per_piece = cached
+            inverse_permutation = self._symmetry_tables.inverse_action_permutations[
+                agent
+            ][symmetry]
+            legal_moves = np.sort(inverse_permutation[canonical_moves]).tolist()
+            self.legal_moves_per_piece[agent] = legal_moves_per_piece.astype(float)
+        else:
+            legal_moves = []
+            self.legal_moves_per_piece[agent] = np.zeros(self.board.num_pieces)
+
+            for act in range(self.board.num_actions):
+                if self.board.is_legal(agent, act):
+                    legal_moves.append(act)
+                    self.legal_moves_per_piece[agent][
+                        self.board.action_to_piece_map(act)[0]
+                    ] += 1
+
+            if self.legal_move_cache is not None:
+                permutation = self._symmetry_tables.action_permutations[agent][symmetry]
+                self.legal_move_cache.put(
+                    cache_key,
+                    (
+                        permutation[legal_moves].astype(np.uint16),
+                        self.legal_moves_per_piece[agent].astype(np.uint16),
+                    ),
+                )
         self.legal_pieces[agent] = self.legal_moves_per_piece[agent].nonzero()[0]
         self.legal_moves[agent] = legal_moves
 
+        # Update the spatial action mask in place (see action_mask_grid)
+        action_mask_grid = self.action_mask_grids[agent].reshape(-1)
+        action_mask_grid[:] = 0
+        action_mask_grid[self.board.action_grid_index[agent][legal_moves]] = 1
+
     # Calculate rewards for a given step: score of piece placed + amount of territory claimed + size of piece removed
     # Score of a piece placed: size of piece - size of largest legally playable piece remaining
     # This penalizes playing small pieces when there are larger pieces available to place, rewards claiming territory
@@ -245,47 +585,7 @@ class raw_env(AECEnv):
     # Calculate score heuristic: squares/turn + difference between total squares remaining + difference in territory
     # Score will be positive if agent has placed more large pieces, or claimed more territory
     def _calculate_score(self):
-        _, score = self.board.get_score()
-
-        # Difference between average size of pieces placed per turn: agent avg size per turn - opponent avg size per turn
-        # Positive if agent has placed larger pieces per turn on average
-        if self.turns[self.agents[0]] != 0:
-            avg_agent_0 = (
-                self.board.total_piece_squares - score[self.agents[0]]
-            ) / self.turns[self.agents[0]]
-            avg_agent_1 = (
-                self.board.total_piece_squares - score[self.agents[1]]
-            ) / self.turns[self.agents[1]]
-            # self.score[self.agents[0]]["squares_per_turn"] = avg_agent_0 - avg_agent_1
-            # self.score[self.agents[1]]["squares_per_turn"] = avg_agent_1 - avg_agent_0
-            self.score[self.agents[0]]["squares_per_turn"] = avg_agent_0
-            self.score[self.agents[1]]["squares_per_turn"] = avg_agent_1
-
-        # Difference between number of total squares remaining (opponent squares remaining - agent squares remaining)
-        # Positive if the opponent has more total squares remaining (penalizes pieces being captured)
-        self.score[self.agents[0]]["remaining_pieces"] = (
-            score[self.agents[1]] - score[self.agents[0]]
-        )
-        self.score[self.agents[1]]["remaining_pieces"] = (
-            score[self.agents[0]] - score[self.agents[1]]
-        )
-
-        # Difference in territory (agent's total territory - opponent's total territory)
-        # Positive if the opponent has less total territory claimed
-        territory = self.board.territory
-        self.score[self.agents[0]]["territory"] = len(territory[territory == 1]) - len(
-            territory[territory == 2]
-        )
-        self.score[self.agents[1]]["territory"] = len(territory[territory == 2]) - len(
-            territory[territory == 1]
-        )
-
-        for i in range(2):
-            self.score[self.agents[i]]["total"] = (
-                self.score[self.agents[i]]["squares_per_turn"]
-                + self.score[self.agents[i]]["remaining_pieces"]
-                + self.score[self.agents[i]]["territory"]
-            )
+        update_score(self.score, self.board, self.turns, self.agents)
 
     # Calculate winner at the end of game
     def _calculate_winner(self):
@@ -316,18 +616,42 @@ class raw_env(AECEnv):
             self.truncations[self.agent_selection]
             or self.terminations[self.agent_selection]
         ):
-
             return self._was_dead_step(action)
 
-        # Check that it is a valid move
-        if not self.board.is_legal(self.agent_selection, action):
-            raise Exception("played illegal move.")
+        timer = self.step_timer
+        if timer:
+            timer.start()
+        try:
+            # Check that it is a valid move
+            if not self.board.is_legal(self.agent_selection, action):
+                raise Exception("played illegal move.")
+            if timer:
+                timer.lap("is_legal")
+            self._play_legal_move(action)
+        finally:
+            # The timer is closed on every path, so that the next step is timed on its own
+            if timer:
+                self._finish_step_timing()
+
+    # Rest of step() once the move is known to be legal
+    def _play_legal_move(self, action):
+        timer = self.step_timer
+
+        # Per-move rewards compare the piece played with the largest legal piece
+        if self.per_move_rewards and len(self.legal_moves[self.agent_selection]) == 0:
+            self._calculate_legal_moves(self.agent_selection)
+            if timer:
+                timer.lap("calculate_legal_moves")
 
         # Play the turn
         piece_size = self.board.play_turn(self.agent_selection, action)
+        if timer:
+            timer.lap("play_turn")
         territory_claimed, piece_removed_size = self.board.check_territory(
             self.agent_selection
         )
+        if timer:
+            timer.lap("check_territory")
 
         # Don't count placing the cathedral as a turn (only count placing regular pieces)
         if piece_size != 6:
@@ -338,41 +662,69 @@ class raw_env(AECEnv):
                 piece_size, territory_claimed, piece_removed_size
             )  # Heuristic reward for current move
         self._accumulate_rewards()
+        if timer:
+            timer.lap("calculate_rewards")
 
         # Calculate score heuristics every other turn (when both agents have placed the same number of pieces)
         if self.turns[self.agents[0]] == self.turns[self.agents[1]]:
             self._calculate_score()
+            if timer:
+                timer.lap("calculate_score")
 
+        # Game over is detected without listing every legal move (see Board.has_legal_move)
         next_agent = self._agent_selector.next()
+        next_agent_can_move = self.board.has_legal_move(next_agent)
+        agent_can_move = next_agent_can_move or self.board.has_legal_move(
+            self.agent_selection
+        )
+        if timer:
+            timer.lap("has_legal_move")
 
         # If the next agent has legal moves to play, switch agents
-        self._calculate_legal_moves(next_agent)
-        if len(self.legal_moves[next_agent]) != 0:
+        if next_agent_can_move:
             self.agent_selection = next_agent
 
         # If both agents have zero moves left (game over), calculate winners
-        else:
-            self._calculate_legal_moves(self.agent_selection)
-            if len(self.legal_moves[self.agent_selection]) == 0:
-                self._calculate_score()  # Calculate score heuristics (even if one agent has played more turns)
-                self._calculate_winner()
-                # print("GAME OVER")
-                # return self._was_dead_step(action)
+        elif not agent_can_move:
+            self._calculate_score()  # Calculate score heuristics (even if one agent has played more turns)
+            if timer:
+                timer.lap("calculate_score")
+            self._calculate_winner()
+            if timer:
+                timer.lap("calculate_winner")
 
-            # If the next agent has no legal moves left, current agent continues placing pieces
-            else:
-                # print(f"{next_agent} out of moves, {self.agent_selection} continues placing")
-                if len(self.legal_moves[self.agent_selection]) == 0:
-                    self.terminations[self.agent_selection] = True
+        # Otherwise the next agent has no legal moves left, and the current agent continues placing pieces
+
+        # Legal moves of the agent to play are calculated when they are needed (observations, per-move rewards)
+        self.legal_moves[self.agent_selection] = []
 
         if self.render_mode == "human":
             self.render()
+            if timer:
+                timer.lap("render")
         # else:
         # print(f"Cumulative rewards: {self._cumulative_rewards}, rewards: {self.rewards}")
 
+    # Ends the timed step and publishes its phase timings in infos
+    def _finish_step_timing(self):
+        timer = self.step_timer
+        timer.finish()
+        step_timing = {"last": timer.last, "cumulative": dict(timer.cumulative)}
+        for agent in self.infos:
+            self.infos[agent]["step_timing"] = step_timing
+
+    # Step phase timings (seconds): number of timed steps, last step, cumulative and mean per step (see StepTimer)
+    def step_timing_stats(self):
+        if self.step_timer is None:
+            raise ValueError(
+                "Step timing is disabled, create the env with step_timing=True"
+            )
+        return self.step_timer.stats()
+
     def reset(self, seed=None, return_info=False, options=None):
         # reset environment
         self.board = Board()
+        self.board.counters = self.operation_counters
 
         self.agents = self.possible_agents[:]
         self.rewards = {i: 0 for i in self.agents}
@@ -395,6 +747,12 @@ class raw_env(AECEnv):
         }
         self.legal_pieces = {agent: [] for agent in self.agents}
 
+        # Legal action masks in (piece, rotation, x, y) layout, updated in place by _calculate_legal_moves
+        self.action_mask_grids = {
+            agent: np.zeros(self.board.action_grid_shape, dtype=np.int8)
+            for agent in self.agents
+        }
+
         # Additional info about game outcome
         self.winner = -1
         self.score = {
@@ -412,6 +770,141 @@ class raw_env(AECEnv):
         self._score = {name: 0 for name in self.agents}
         self._piece_score = {name: 0 for name in self.agents}
 
+        # Start from a serialized game state (see get_state) instead of the empty board, without replaying moves
+        if options is not None and options.get("state") is not None:
+            self._set_state(options["state"])
+
+    # Serializable snapshot of an in-progress game, which can be restored with reset(options={"state": state})
+    def get_state(self):
+        return {
+            "board": self.board.get_state(),
+            "turns": dict(self.turns),
+            "agent_selection": self.agent_selection,
+            "selector_agent": self._agent_selector.selected_agent,
+            "score": {agent: dict(score) for agent, score in self.score.items()},
+            "rewards": dict(self.rewards),
+            "cumulative_rewards": dict(self._cumulative_rewards),
+        }
+
+    def _set_state(self, state):
+        self.board.set_state(state["board"])
+        self.turns = dict(state["turns"])
+
+        # The agent selector can differ from agent_selection when one agent is out of moves and the other continues
+        selector_agent = state.get("selector_agent", state["agent_selection"])
+        if selector_agent not in self.possible_agents:
+            raise ValueError(
+                f"Unknown selector_agent {selector_agent!r}, expected one of {self.possible_agents}"
+            )
+        self.agent_selection = self._agent_selector.reset()
+        while self._agent_selector.selected_agent != selector_agent:
+            self._agent_selector.next()
+        self.agent_selection = state["agent_selection"]
+
+        # Rewards are optional: leave them out to start counting returns from the restored position
+        if state.get("rewards") is not None:
+            self.rewards = dict(state["rewards"])
+        if state.get("cumulative_rewards") is not None:
+            self._cumulative_rewards = dict(state["cumulative_rewards"])
+
+        # Score heuristics are only updated by step() after a move that leaves both agents with the same number of
+        # turns: without a stored score they can only be recomputed in such a position (otherwise they keep their
+        # reset values, pass the score to restore them exactly)
+        if state.get("score") is not None:
+            self.score = {agent: dict(score) for agent, score in state["score"].items()}
+        elif (
+            self.turns[self.agents[0]] == self.turns[self.agents[1]]
+            and self.board.squares.any()
+        ):
+            self._calculate_score()
+
+    # Pickles the constructor options and the mutable game state only: action tables and spaces are rebuilt by
+    # __init__ (action tables are shared per process), legal moves are recalculated when needed, the legal move
+    # cache starts empty, and pygame handles are not pickled (a new window is opened in human render mode)
+    # States are tuples rather than dicts to keep pickles small (well under 1 KB without instrumentation)
+    def __getstate__(self):
+        game = None
+        if hasattr(self, "_agent_selector"):
+            state = self.get_state()
+            game = (
+                self.board,  # Pickles itself compactly (see Board.__getstate__)
+                state["turns"],
+                state["agent_selection"],
+                state["selector_agent"],
+                state["score"],
+                state["rewards"],
+                state["cumulative_rewards"],
+                list(self.agents),
+                self.terminations,
+                self.truncations,
+                self.infos,
+                getattr(self, "_skip_agent_selection", None),
+                self.winner,
+                {
+                    agent: [self.board.pieces[agent].index(piece) for piece in pieces]
+                    for agent, pieces in self.final_pieces.items()
+                },
+                getattr(self, "piece_score", None),
+            )
+        # Options are pickled as values, in the order of the __init__ arguments
+        return (
+            tuple(self._options.values()),
+            game,
+            self.step_timer,
+            self.operation_counters,
+        )
+
+    def __setstate__(self, state):
+        options, game, step_timer, operation_counters = state
+        self.__init__(*options)
+        self.step_timer = step_timer
+        self.operation_counters = operation_counters
+        if game is None:
+            return
+
+        (
+            board,
+            turns,
+            agent_selection,
+            selector_agent,
+            score,
+            rewards,
+            cumulative_rewards,
+            agents,
+            terminations,
+            truncations,
+            infos,
+            skip_agent_selection,
+            winner,
+            final_pieces,
+            piece_score,
+        ) = game
+        self.reset(
+            options={
+                "state": {
+                    "board": board.get_state(),
+                    "turns": turns,
+                    "agent_selection": agent_selection,
+                    "selector_agent": selector_agent,
+                    "score": score,
+                    "rewards": rewards,
+                    "cumulative_rewards": cumulative_rewards,
+                }
+            }
+        )
+        self.agents = agents
+        self.terminations = terminations
+        self.truncations = truncations
+        self.infos = infos
+        self._skip_agent_selection = skip_agent_selection
+        self.winner = winner
+        self.final_pieces = {
+            agent: [self.board.pieces[agent][piece] for piece in pieces]
+            for agent, pieces in final_pieces.items()
+        }
+        if piece_score is not None:
+            self.piece_score = piece_score
+
     def render(self):
         if self.render_mode is None:
             gymnasium.logger.warn(
@@ -420,74 +913,192 @@ class raw_env(AECEnv):
             return
 
         elif self.render_mode == "human":
+            import pygame
+
             self.clock.tick(self.metadata["render_fps"])
 
-            # Only render if there is something to render
             block_size = int(self.WINDOW_WIDTH / 10)  # Set the size of the grid block
-            border_color = (0, 0, 0)
-            self.colors = {
-                0: (211, 211, 211),
-                1: (221, 186, 151),
-                2: (120, 65, 65),
-                3: (128, 128, 162),
-                4: (238, 221, 203),
-                5: (188, 160, 160),
-                6: (0, 0, 0),
-                7: (233, 210, 187),
-                8: (208, 189, 189),
-                9: (172, 172, 195),
-            }  # old cathedral preview color (192,221,208)
-
-            for x, x_screen in enumerate(range(0, self.WINDOW_WIDTH, block_size)):
-                for y, y_screen in enumerate(range(0, self.WINDOW_HEIGHT, block_size)):
-                    # If space is empty and in a player's territory, color it to mark that it is territory
-                    if (
-                        self.board.territory.reshape(10, 10)[x, y] > 0
-                        and self.board.squares.reshape(10, 10)[x, y] == 0
-                    ):
-                        color = self.colors[
-                            self.board.territory.reshape(10, 10)[x, y] + 3
-                        ]
-                    else:
-                        color = self.colors[self.board.squares.reshape(10, 10)[x, y]]
-
-                    if color == self.colors[0]:
-                        border = False
-                    else:
-                        border = True
-
-                    def draw_square(
-                        surface, x, y, width, height, color, border_color, border
-                    ):
-                        pygame.draw.rect(surface, color, (x, y, width, height), 0)
-                        if border:
-                            pygame.draw.rect(
-                                surface, border_color, (x, y, width, height), 2
-                            )
-                        else:
-                            pygame.draw.rect(
-                                surface, border_color, (x, y, width, height), 1
-                            )
 
-                    draw_square(
-                        self.window,
-                        x_screen,
-                        y_screen,
-                        block_size,
-                        block_size,
-                        color,
-                        border_color,
-                        border,
-                    )
-
-            pygame.display.update()
+            # If space is empty and in a player's territory, color it to mark that it is territory
+            squares = self.board.squares.reshape(10, 10)
+            territory = self.board.territory.reshape(10, 10)
+            values = np.where((territory > 0) & (squares == 0), territory + 3, squares)
+
+            # Only redraw squares whose color changed since the last render (all squares the first time)
+            if self._drawn_values is None:
+                changed = np.ones((10, 10), dtype=bool)
+            else:
+                changed = values != self._drawn_values
+            self._drawn_values = values
+
+            dirty_rects = []
+            for x, y in zip(*np.nonzero(changed)):
+                color = self.colors[values[x, y]]
+                rect = pygame.Rect(
+                    x * block_size, y * block_size, block_size, block_size
+                )
+                pygame.draw.rect(self.window, color, rect, 0)
+                # Squares with the empty color get a thinner border
+                border_width = 1 if color == self.colors[0] else 2
+                pygame.draw.rect(self.window, self.border_color, rect, border_width)
+                dirty_rects.append(rect)
+
+            if dirty_rects:
+                pygame.display.update(dirty_rects)
+        elif self.render_mode == "rgb_array":
+            return self._render_rgb_array()
         elif self.render_mode == "text":
             print("Board: \n", self.board.squares.reshape(10, 10))
             print("Territory: \n", self.board.territory.reshape(10, 10))
 
+    # Same picture as the pygame window: (height, width, 3) uint8 array, x along the width and y along the height
+    # The returned frame is cached and read-only, rendering the same board again returns it without redrawing
+    def _render_rgb_array(self):
+        key = self.board.squares.tobytes() + self.board.territory.tobytes()
+        if key == self._rgb_array_key:
+            return self._rgb_array_frame
+
+        squares = self.board.squares.reshape(10, 10)
+        territory = self.board.territory.reshape(10, 10)
+        # Empty squares in a player's territory are colored to mark that they are territory
+        values = np.where((territory > 0) & (squares == 0), territory + 3, squares)
+        palette = np.zeros((max(self.colors) + 1, 3), dtype=np.uint8)
+        for value, color in self.colors.items():
+            palette[value] = color
+
+        block_size = int(self.WINDOW_WIDTH / 10)
+        cells = palette[values.astype(np.int64).T]
+        frame = cells.repeat(block_size, axis=0).repeat(block_size, axis=1)
+
+        # Squares with the empty color get a 1 pixel border, others a 2 pixel border
+        thin = np.all(cells == self.colors[0], axis=2)
+        thin = thin.repeat(block_size, axis=0).repeat(block_size, axis=1)
+        border = np.where(thin, self._rgb_array_borders[1], self._rgb_array_borders[2])
+        frame[border] = self.border_color
+
+        frame.flags.writeable = False
+        self._rgb_array_frame = frame
+        self._rgb_array_key = key
+        return frame
+
     def close(self):
         if self.render_mode == "human":
             import pygame
 
             pygame.quit()
             self.screen = None
+
+
+class fast_env(raw_env):
+    """
+    Same behavior as env(), with the checks of its wrappers done inline instead of through three wrapper layers:
+    illegal moves end the game with a reward of -1 for the agent playing them (TerminateIllegalWrapper), actions are
+    asserted to be in the action space (AssertOutOfBoundsWrapper), and step/observe/render before reset are errors
+    (OrderEnforcingWrapper). Legality is checked once with board.is_legal instead of with the previous action mask.
+    """
+
+    illegal_reward = -1
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._has_reset = False
+        self._has_rendered = False
+        self._has_updated = False
+        self._illegal_move_agent = None
+
+    def reset(self, seed=None, return_info=False, options=None):
+        self._has_reset = True
+        self._has_updated = True
+        self._illegal_move_agent = None
+        super().reset(seed=seed, return_info=return_info, options=options)
+
+    def observe(self, agent):
+        if not self._has_reset:
+            EnvLogger.error_observe_before_reset()
+        if self._illegal_move_agent is None:
+            return super().observe(agent)
+
+        # After an illegal move, observations are those of the position the move was played in (only the agent who
+        # played it has legal moves), although agent_selection now iterates over the terminated agents
+        agent_selection = self.agent_selection
+        self.agent_selection = self._illegal_move_agent
+        try:
+            return super().observe(agent)
+        finally:
+            self.agent_selection = agent_selection
+
+    def step(self, action):
+        if not self._has_reset:
+            EnvLogger.error_step_before_reset()
+        self._has_updated = True
+        if not self.agents:
+            EnvLogger.warn_step_after_terminated_truncated()
+            return
+
+        agent = self.agent_selection
+        if self.terminations[agent] or self.truncations[agent]:
+            assert action is None or self.action_space(agent).contains(
+                action
+            ), "action is not in action space"
+            return self._was_dead_step(action)
+        assert self.action_space(agent).contains(
+            action
+        ), "action is not in action space"
+
+        timer = self.step_timer
+        if timer:
+            timer.start()
+        try:
+            legal = self.board.is_legal(agent, action)
+            if timer:
+                timer.lap("is_legal")
+            if not legal:
+                return self._terminate_illegal_move(agent)
+            self._play_legal_move(action)
+        finally:
+            if timer:
+                self._finish_step_timing()
+
+    # Ends the game as TerminateIllegalWrapper does: every agent is terminated, the agent who played the illegal move
+    # gets illegal_reward (its previous returns are discarded) and the other agent gets 0
+    def _terminate_illegal_move(self, agent):
+        EnvLogger.warn_on_illegal_move()
+        self._cumulative_rewards[agent] = 0
+        self.terminations = {i: True for i in self.agents}
+        self.truncations = {i: True for i in self.agents}
+        self.rewards = {i: 0 for i in self.agents}
+        self.rewards[agent] = float(self.illegal_reward)
+        self._accumulate_rewards()
+        self._deads_step_first()
+        self._illegal_move_agent = agent
+
+    # Order enforcement and illegal move state are pickled after the state of raw_env
+    def __getstate__(self):
+        return super().__getstate__() + (
+            (
+                self._has_reset,
+                self._has_rendered,
+                self._has_updated,
+                self._illegal_move_agent,
+            ),
+        )
+
+    def __setstate__(self, state):
+        super().__setstate__(state[:-1])
+        (
+            self._has_reset,
+            self._has_rendered,
+            self._has_updated,
+            self._illegal_move_agent,
+        ) = state[-1]
+
+    def render(self):
+        if not self._has_reset:
+            EnvLogger.error_render_before_reset()
+        self._has_rendered = True
+        return super().render()
+
+    def agent_iter(self, max_iter=2**63):
+        if not self._has_reset:
+            EnvLogger.error_agent_iter_before_reset()
+        return AECOrderEnforcingIterable(self, max_iter)
@@ -0,0 +1,64 @@
+import numpy as np
+
+# Observation planes: (10, 10, 5) binary values -> 500 bits -> 63 bytes when packed
+OBSERVATION_SHAPE = (10, 10, 5)
+OBSERVATION_BITS = int(np.prod(OBSERVATION_SHAPE))
+PACKED_OBSERVATION_SIZE = (OBSERVATION_BITS + 7) // 8
+
+
+# Number of bytes needed to store a packed action mask with num_actions entries
+def packed_mask_size(num_actions):
+    return (num_actions + 7) // 8
+
+
+# Packs binary observation planes into bytes, shape (..., 10, 10, 5) -> (..., 63) uint8
+# Works on a single observation or on a batch of observations (any number of leading dimensions)
+def pack_observations(observations):
+    observations = np.asarray(observations)
+    batch_shape = observations.shape[: observations.ndim - len(OBSERVATION_SHAPE)]
+    flat = observations.reshape(batch_shape + (OBSERVATION_BITS,))
+    return np.packbits(flat != 0, axis=-1)
+
+
+# Inverse of pack_observations: (..., 63) uint8 -> (..., 10, 10, 5) int8
+def unpack_observations(packed_observations):
+    packed_observations = np.asarray(packed_observations, dtype=np.uint8)
+    batch_shape = packed_observations.shape[:-1]
+    flat = np.unpackbits(packed_observations, axis=-1, count=OBSERVATION_BITS)
+    return flat.reshape(batch_shape + OBSERVATION_SHAPE).view(np.int8)
+
+
+# Packs action masks into bytes, shape (..., num_actions) -> (..., ceil(num_actions / 8)) uint8
+def pack_action_masks(action_masks):
+    return np.packbits(np.asarray(action_masks) != 0, axis=-1)
+
+
+# Inverse of pack_action_masks: num_actions is required to strip the padding bits of the last byte
+def unpack_action_masks(packed_masks, num_actions):
+    packed_masks = np.asarray(packed_masks, dtype=np.uint8)
+    return np.unpackbits(packed_masks, axis=-1, count=num_actions).view(np.int8)
+
+
+# Packs a full observation dict (as returned by raw_env.observe) or a batch of them
+# The "piece_mask" of hierarchical observations is packed like an action mask
+def pack_observation_dict(obs):
+    packed_obs = {
+        "observation": pack_observations(obs["observation"]),
+        "action_mask": pack_action_masks(obs["action_mask"]),
+    }
+    if "piece_mask" in obs:
+        packed_obs["piece_mask"] = pack_action_masks(obs["piece_mask"])
+    return packed_obs
+
+
+# Inverse of pack_observation_dict, num_pieces is required if the packed dict has a "piece_mask"
+def unpack_observation_dict(packed_obs, num_actions, num_pieces=None):
+    obs = {
+        "observation": unpack_observations(packed_obs["observation"]),
+        "action_mask": unpack_action_masks(packed_obs["action_mask"], num_actions),
+    }
+    if "piece_mask" in packed_obs:
+        if num_pieces is None:
+            raise ValueError("num_pieces is required to unpack a piece_mask")
+        obs["piece_mask"] = unpack_action_masks(packed_obs["piece_mask"], num_pieces)
+    return obs
@@ -0,0 +1,119 @@
+from types import MappingProxyType
+
+# Canonical cell offsets (dx, dy) of every piece relative to its reference point [x], with rotation 0
+BASE_OFFSETS = MappingProxyType(
+    {
+        # Single piece
+        # [x]
+        "Tavern1": ((0, 0),),
+        "Tavern2": ((0, 0),),
+        # Double piece
+        # [ ]
+        # [x]
+        "Stable1": ((0, 0), (0, 1)),
+        "Stable2": ((0, 0), (0, 1)),
+        # L shape
+        # [ ]
+        # [x][ ]
+        "Inn1": ((0, 0), (0, 1), (1, 0)),
+        "Inn2": ((0, 0), (0, 1), (1, 0)),
+        # Triple piece
+        # [ ]
+        # [x]
+        # [ ]
+        "Bridge": ((0, 0), (0, 1), (0, -1)),
+        # Square shape
+        # [ ][ ]
+        # [x][ ]
+        "Square": ((0, 0), (0, 1), (1, 0), (1, 1)),
+        # T shape
+        #    [ ]
+        # [ ][x][ ]
+        "Manor": ((0, 0), (-1, 0), (1, 0), (0, 1)),
+        # Z shape
+        #    [ ][ ]
+        # [ ][x]
+        "Abbey": ((0, 0), (-1, 0), (0, 1), (1, 1)),
+        # Z shape (flipped)
+        # [ ][ ]
+        #    [x][ ]
+        "AbbeyFlipped": ((0, 0), (-1, 0), (0, 1), (1, 1)),
+        #       [ ]
+        # [ ][x][ ]
+        #    [ ]
+        "Academy": ((0, 0), (-1, 0), (1, 0), (0, -1), (1, 1)),
+        # [ ]
+        # [ ][x][ ]
+        #    [ ]
+        "AcademyFlipped": ((0, 0), (-1, 0), (1, 0), (0, -1), (1, 1)),
+        # Plus shape
+        #    [ ]
+        # [ ][x][ ]
+        #    [ ]
+        "Infirmary": ((0, 0), (-1, 0), (1, 0), (0, 1), (0, -1)),
+        # U Shape
+        # [ ]   [ ]
+        # [ ][x][ ]
+        "Castle": ((0, 0), (-1, 0), (1, 0), (-1, 1), (1, 1)),
+        # W Shape
+        # [ ][ ]
+        #    [x][ ]
+        #       [ ]
+        "Tower": ((0, 0), (1, 0), (1, -1), (0, 1), (-1, 1)),
+        # Tall cross shape
+        #    [ ]
+        # [ ][ ][ ]
+        #    [x]
+        #    [ ]
+        "Cathedral": ((0, 0), (0, -1), (0, 1), (-1, 1), (1, 1), (0, 2)),
+    }
+)
+
+# Number of clockwise quarter turns applied to the base offsets for rotations of 0, 90, 180 and 270 degrees
+# Symmetric pieces do not change shape when rotated, and two-fold symmetric pieces only use a single turn
+ROTATION_TURNS = MappingProxyType(
+    {
+        "Tavern1": (0, 0, 0, 0),
+        "Tavern2": (0, 0, 0, 0),
+        "Square": (0, 0, 0, 0),
+        "Infirmary": (0, 0, 0, 0),
+        "Stable1": (0, 1, 0, 1),
+        "Stable2": (0, 1, 0, 1),
+        "Bridge": (0, 1, 0, 1),
+    }
+)
+DEFAULT_ROTATION_TURNS = (0, 1, 2, 3)
+
+
+# Clockwise quarter turn of offsets around the reference point, (dx, dy) @ [(0, -1), (1, 0)] = (dy, -dx)
+def rotate_offsets(offsets):
+    return tuple((dy, -dx) for dx, dy in offsets)
+
+
+def _quarter_turns(offsets):
+    turns = [offsets]
+    for _ in range(3):
+        turns.append(rotate_offsets(turns[-1]))
+    return tuple(turns)
+
+
+# PIECE_GEOMETRY[label][turns] = cell offsets of the piece after the given number of clockwise quarter turns
+PIECE_GEOMETRY = MappingProxyType(
+    {label: _quarter_turns(offsets) for label, offsets in BASE_OFFSETS.items()}
+)
+
+# PIECE_ROTATIONS[label][rotation // 90] = cell offsets of the piece placed with the given rotation (degrees)
+PIECE_ROTATIONS = MappingProxyType(
+    {
+        label: tuple(
+            PIECE_GEOMETRY[label][turns]
+            for turns in ROTATION_TURNS.get(label, DEFAULT_ROTATION_TURNS)
+        )
+        for label in BASE_OFFSETS
+    }
+)
+
+# Number of squares occupied by each piece
+PIECE_SIZES = MappingProxyType(
+    {label: len(offsets) for label, offsets in BASE_OFFSETS.items()}
+)
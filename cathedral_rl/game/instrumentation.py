@@ -0,0 +1,124 @@
+import os
+import time
+
+
+class StepTimer:
+    """
+    Monotonic timers for the phases of raw_env.step (is_legal, play_turn, check_territory, ...)
+    Phases are timed sequentially with lap(), each lap is charged to the phase which just finished
+    """
+
+    def __init__(self):
+        self.last = {}
+        self.cumulative = {}
+        self.steps = 0
+        self._start = 0.0
+        self._mark = 0.0
+
+    def start(self):
+        self.last = {}
+        self._start = self._mark = time.perf_counter()
+
+    # Charges the time since the previous lap (or start) to the given phase
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.last[phase] = self.last.get(phase, 0.0) + now - self._mark
+        self._mark = now
+
+    def finish(self):
+        self.last["total"] = time.perf_counter() - self._start
+        for phase, seconds in self.last.items():
+            self.cumulative[phase] = self.cumulative.get(phase, 0.0) + seconds
+        self.steps += 1
+
+    def reset(self):
+        self.last = {}
+        self.cumulative = {}
+        self.steps = 0
+
+    # Timings in seconds: last step, cumulative over all steps, and mean per step
+    def stats(self):
+        return {
+            "steps": self.steps,
+            "last": dict(self.last),
+            "cumulative": dict(self.cumulative),
+            "mean": {
+                phase: seconds / self.steps
+                for phase, seconds in self.cumulative.items()
+            },
+        }
+
+
+class OperationCounters:
+    """
+    Counts of the work done by the territory and legality engines of a Board (see Board.counters)
+    Counters of several envs (e.g., in a vector env) can be summed with aggregate_counters
+    """
+
+    # Counter name -> description (used as HELP text for Prometheus exports)
+    descriptions = {
+        "is_legal_calls": "Calls to Board.is_legal",
+        "is_legal_early_rejections": "Moves rejected by is_legal before checking squares (piece not available)",
+        "is_legal_rejections": "Moves rejected by is_legal",
+        "has_legal_move_calls": "Calls to Board.has_legal_move",
+        "has_legal_move_pieces_scanned": "Pieces checked for a legal placement by has_legal_move",
+        "check_territory_calls": "Calls to Board.check_territory",
+        "pieces_probed": "Placed pieces tried for removal by check_territory",
+        "get_territory_calls": "Calls to Board.get_territory",
+        "territory_cache_hits": "get_territory calls answered from the territory cache",
+        "flood_fills": "Regions flood filled by remove_empty_spaces",
+        "flood_fill_cells": "Empty squares visited by remove_empty_spaces",
+    }
+    __slots__ = tuple(descriptions)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __add__(self, other):
+        total = OperationCounters()
+        for name in self.__slots__:
+            setattr(total, name, getattr(self, name) + getattr(other, name))
+        return total
+
+    def __repr__(self):
+        return f"OperationCounters({self.as_dict()})"
+
+    # Prometheus text exposition format, e.g., cathedral_is_legal_calls_total{env="0"} 2969
+    def to_prometheus(self, prefix="cathedral_", labels=None):
+        label_str = ""
+        if labels:
+            label_str = (
+                "{"
+                + ",".join(f'{key}="{value}"' for key, value in labels.items())
+                + "}"
+            )
+        lines = []
+        for name in self.__slots__:
+            metric = f"{prefix}{name}_total"
+            lines.append(f"# HELP {metric} {self.descriptions[name]}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{label_str} {getattr(self, name)}")
+        return "\n".join(lines) + "\n"
+
+    # Writes the Prometheus text file atomically (as expected by node_exporter's textfile collector)
+    def write_prometheus(self, path, prefix="cathedral_", labels=None):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus(prefix, labels))
+        os.replace(tmp_path, path)
+
+
+# Sums the counters of several envs (None entries, from envs without counters, are skipped)
+def aggregate_counters(counters):
+    total = OperationCounters()
+    for c in counters:
+        if c is not None:
+            total = total + c
+    return total
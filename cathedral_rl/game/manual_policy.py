@@ -1,20 +1,20 @@
 import sys
 
 import numpy as np
-import pygame
 
 from .utils import GIFRecorder
 
 
 class ManualPolicy:
     def __init__(self, env, agent_id: int = 0, recorder: GIFRecorder = None):
-
         self.env = env
         self.agent_id = agent_id
         self.agent = self.env.agents[self.agent_id]
         self.recorder = recorder
 
     def __call__(self, observation, agent):
+        import pygame
+
         # only trigger when we are the correct agent
         assert (
             agent == self.agent
@@ -164,7 +164,6 @@ class ManualPolicy:
 
                 """ UPDATE DISPLAY with previewed move"""
                 env.render()
-                pygame.display.update()
                 if recorder is not None:
                     recorder.capture_frame(env.unwrapped.screen)
 
@@ -1,38 +1,55 @@
-import numpy as np
+from .geometry import (
+    DEFAULT_ROTATION_TURNS,
+    PIECE_GEOMETRY,
+    PIECE_SIZES,
+    ROTATION_TURNS,
+)
 
 
 class Piece:
     """
-    Base class for Cathedral pieces, with functions to rotate and flip pieces
+    Base class for Cathedral pieces: a thin view over the precomputed geometry registry (see geometry.py)
+    Only the reference position, rotation and placement state are stored per piece
     """
 
+    __slots__ = ("position", "rotation", "placed", "removed", "_turns")
+    label = None
+
     def __init__(self):
-        self.rotation_matrix = np.array([(0, -1), (1, 0)])
-        self.rotation_matrix_ccw = np.array([(0, 1), (-1, 0)])
         self.position = (0, 0)
-        self.points = []
         self.rotation = 0
         self.placed = False
         self.removed = False
-        self.name = self.__class__.__name__
+        # Number of clockwise quarter turns applied to the base shape (index into PIECE_GEOMETRY[label])
+        self._turns = 0
+        self.set_unplaced()
+
+    @property
+    def name(self):
+        return self.label
 
     @property
     def size(self):
-        return len(self.points)
+        return PIECE_SIZES[self.label]
 
+    # Points occupied by the piece: [(x1, y1), ..., (xn, yn)]
+    @property
+    def points(self):
+        x, y = self.position
+        return [(x + dx, y + dy) for dx, dy in PIECE_GEOMETRY[self.label][self._turns]]
+
+    # Resets the piece to the given reference position with rotation 0
     def set_position(self, x, y):
-        raise NotImplementedError()
+        self.position = (x, y)
+        self.rotation = 0
+        self._turns = 0
 
     def set_rotation(self, degree):
         if degree in [0, 90, 180, 270]:
-            # Reset piece
-            x, y = self.position
-            self.set_position(x, y)
-
-            # Rotate piece
-            rotations = int(degree / 90)
-            for i in range(rotations):
-                self.rotate()
+            self.rotation = degree
+            self._turns = ROTATION_TURNS.get(self.label, DEFAULT_ROTATION_TURNS)[
+                degree // 90
+            ]
 
     def set_placed(self):
         self.placed = True
@@ -55,30 +72,12 @@ class Piece:
     def is_removed(self):
         return self.removed
 
+    # Rotates the shape of the piece 90 degrees clockwise around its reference point
     def rotate(self):
-        # """
-        # Returns the points that would be covered by a
-        # shape that is rotated 0, 90, 180, of 270 degrees
-        # in a clockwise direction.
-        # """
         self.rotation = (self.rotation + 90) % 360
+        self._turns = (self._turns + 1) % 4
 
-        reference = np.array([self.position])
-        points = np.array(self.points)
-
-        points = (points - reference) @ self.rotation_matrix + reference
-        self.points = list(map(tuple, points))
-
+    # Rotates the shape of the piece 90 degrees counter-clockwise around its reference point
     def rotate_ccw(self):
-        # """
-        # Returns the points that would be covered by a
-        # shape that is rotated 0, 90, 180, of 270 degrees
-        # in a counter-clockwise direction.
-        # """
         self.rotation = (self.rotation - 90) % 360
-
-        reference = np.array([self.position])
-        points = np.array(self.points)
-
-        points = (points - reference) @ self.rotation_matrix_ccw + reference
-        self.points = list(map(tuple, points))
+        self._turns = (self._turns - 1) % 4
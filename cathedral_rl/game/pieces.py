@@ -39,311 +39,137 @@ def get_pieces(color):
         ]
 
 
+# Piece shapes (cell offsets for every rotation) are defined in the geometry registry, see geometry.py
+
+
 # Single piece
 # [x]
 class Tavern1(Piece):
+    __slots__ = ()
     label = "Tavern1"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y)]
-
-    def set_rotation(self, degree):
-        if degree in [0, 90, 180, 270]:
-            self.rotation = degree
-        return
-
 
 # Single piece
 # [x]
 class Tavern2(Piece):
+    __slots__ = ()
     label = "Tavern2"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y)]
-        self.rotation = 0
-
-    def set_rotation(self, degree):
-        if degree in [0, 90, 180, 270]:
-            self.rotation = degree
-        return
-
 
 # Double piece
 # [ ]
 # [x]
 class Stable1(Piece):
+    __slots__ = ()
     label = "Stable1"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x, y + 1)]
-        self.rotation = 0
-
-    def set_rotation(self, degree):
-        if degree in [0, 90, 180, 270]:
-            # Reset piece
-            x, y = self.position
-            self.set_position(x, y)
-
-            if degree in [90, 270]:
-                self.rotate()
-            return
-
 
 # Double piece
 # [ ]
 # [x]
 class Stable2(Piece):
+    __slots__ = ()
     label = "Stable2"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x, y + 1)]
-        self.rotation = 0
-
-    def set_rotation(self, degree):
-        if degree in [0, 90, 180, 270]:
-            # Reset piece
-            x, y = self.position
-            self.set_position(x, y)
-
-            if degree in [90, 270]:
-                self.rotate()
-            return
-
 
 # Triple piece
 # [ ]
 # [x]
 # [ ]
 class Bridge(Piece):
+    __slots__ = ()
     label = "Bridge"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x, y + 1), (x, y - 1)]
-        self.rotation = 0
-
-    def set_rotation(self, degree):
-        if degree in [0, 90, 180, 270]:
-            # Reset piece
-            x, y = self.position
-            self.set_position(x, y)
-
-            if degree in [90, 270]:
-                self.rotate()
-            return
-
 
 # L shape
 # [ ]
 # [x][ ]
 class Inn1(Piece):
+    __slots__ = ()
     label = "Inn1"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x, y + 1), (x + 1, y)]
-        self.rotation = 0
-
 
 # L shape
 # [ ]
 # [x][ ]
 class Inn2(Piece):
+    __slots__ = ()
     label = "Inn2"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x, y + 1), (x + 1, y)]
-        self.rotation = 0
-
 
 # Square shape
 # [ ][ ]
 # [x][ ]
 class Square(Piece):
+    __slots__ = ()
     label = "Square"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x, y + 1), (x + 1, y), (x + 1, y + 1)]
-        self.rotation = 0
-
-    def set_rotation(self, degree):
-        if degree in [0, 90, 180, 270]:
-            self.rotation = degree
-        return
-
 
 # T shape
 #    [ ]
 # [ ][x][ ]
 class Manor(Piece):
+    __slots__ = ()
     label = "Manor"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x - 1, y), (x + 1, y), (x, y + 1)]
-        self.rotation = 0
-
 
 # Z shape
 #    [ ][ ]
 # [ ][x]
 class Abbey(Piece):
+    __slots__ = ()
     label = "Abbey"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x - 1, y), (x, y + 1), (x + 1, y + 1)]
-        self.rotation = 0
-
 
 # Z shape (flipped)
 # [ ][ ]
 #    [x][ ]
 class AbbeyFlipped(Piece):
+    __slots__ = ()
     label = "AbbeyFlipped"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x - 1, y), (x, y + 1), (x + 1, y + 1)]
-        self.rotation = 0
-
 
 #       [ ]
 # [ ][x][ ]
 #    [ ]
 class Academy(Piece):
+    __slots__ = ()
     label = "Academy"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x - 1, y), (x + 1, y), (x, y - 1), (x + 1, y + 1)]
-        self.rotation = 0
-
 
 # [ ]
 # [ ][x][ ]
 #    [ ]
 class AcademyFlipped(Piece):
+    __slots__ = ()
     label = "AcademyFlipped"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x - 1, y), (x + 1, y), (x, y - 1), (x + 1, y + 1)]
-        self.rotation = 0
-
 
 # Plus shape
 #    [ ]
 # [ ][x][ ]
 #    [ ]
 class Infirmary(Piece):
+    __slots__ = ()
     label = "Infirmary"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x - 1, y), (x + 1, y), (x, y + 1), (x, y - 1)]
-        self.rotation = 0
-
-    def set_rotation(self, degree):
-        if degree in [0, 90, 180, 270]:
-            self.rotation = degree
-        return
-
 
 # U Shape
 # [ ]   [ ]
 # [ ][x][ ]
 class Castle(Piece):
+    __slots__ = ()
     label = "Castle"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x - 1, y), (x + 1, y), (x - 1, y + 1), (x + 1, y + 1)]
-        self.rotation = 0
-
 
 # W Shape
 # [ ][ ]
 #    [x][ ]
 #       [ ]
 class Tower(Piece):
+    __slots__ = ()
     label = "Tower"
 
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [(x, y), (x + 1, y), (x + 1, y - 1), (x, y + 1), (x - 1, y + 1)]
-        self.rotation = 0
-
 
 # Tall cross shape
 #    [ ]
@@ -351,20 +177,5 @@ class Tower(Piece):
 #    [x]
 #    [ ]
 class Cathedral(Piece):
+    __slots__ = ()
     label = "Cathedral"
-
-    def __init__(self):
-        super().__init__()
-        self.set_unplaced()
-
-    def set_position(self, x, y):
-        self.position = (x, y)
-        self.points = [
-            (x, y),
-            (x, y - 1),
-            (x, y + 1),
-            (x - 1, y + 1),
-            (x + 1, y + 1),
-            (x, y + 2),
-        ]
-        self.rotation = 0
@@ -0,0 +1,45 @@
+import numpy as np
+
+
+class RandomPolicy:
+    """
+    Uniformly random legal moves
+    """
+
+    def __init__(self, env, seed=None):
+        self.env = env
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, observation, agent):
+        return int(self.rng.choice(np.flatnonzero(observation["action_mask"])))
+
+
+class GreedyPolicy:
+    """
+    Places the largest legal piece, choosing uniformly at random among its legal placements
+    """
+
+    def __init__(self, env, seed=None):
+        self.env = env
+        self.rng = np.random.default_rng(seed)
+        board = env.unwrapped.board
+        # Size of the piece placed by each action (both agents have the same pieces, player_0 also has the cathedral)
+        piece_sizes = np.array([piece.size for piece in board.pieces["player_0"]])
+        self.action_sizes = piece_sizes[board.codec.pieces]
+
+    def __call__(self, observation, agent):
+        legal_moves = np.flatnonzero(observation["action_mask"])
+        sizes = self.action_sizes[legal_moves]
+        return int(self.rng.choice(legal_moves[sizes == sizes.max()]))
+
+
+POLICIES = {"random": RandomPolicy, "greedy": GreedyPolicy}
+
+
+# Creates a built-in policy by name
+def get_policy(name, env, seed=None):
+    if name not in POLICIES:
+        raise ValueError(
+            f"Unknown policy {name!r}, expected one of {sorted(POLICIES.keys())}"
+        )
+    return POLICIES[name](env, seed)
@@ -0,0 +1,304 @@
+import struct
+
+import numpy as np
+
+from .board import Board
+from .cathedral import raw_env, update_score
+from .symmetry import canonical_hash
+
+# Binary game record layout (little endian):
+#   header: magic (4 bytes), version (uint8), flags (uint8), seed (int64, only if FLAG_SEED), num_plies (uint16)
+#   actions: uint16 action id per ply
+#   movers: 1 bit per ply (0 = player_0, 1 = player_1), packed with np.packbits
+#   hashes: uint64 canonical position hash after each ply (only if FLAG_HASHES)
+# A 30 ply game without hashes takes 80 bytes, records can be concatenated in a single file
+RECORD_MAGIC = b"CATR"
+RECORD_VERSION = 1
+_HEADER = struct.Struct("<4sBB")
+_SEED = struct.Struct("<q")
+_NUM_PLIES = struct.Struct("<H")
+
+FLAG_HASHES = 1
+FLAG_SEED = 2
+FLAG_PER_MOVE_REWARDS = 4
+FLAG_FINAL_REWARD_SCORE_DIFFERENCE = 8
+
+AGENTS = ("player_0", "player_1")
+
+
+class GameRecord:
+    """
+    Compact record of a single game: env options, seed, and the action played at each ply
+    The agent playing each ply is stored as well, as an agent keeps playing while its opponent is out of moves
+    Optional per-ply position hashes (see symmetry.canonical_hash) allow replays to be verified
+    """
+
+    def __init__(
+        self,
+        seed=None,
+        per_move_rewards=False,
+        final_reward_score_difference=False,
+        with_hashes=False,
+    ):
+        self.seed = seed
+        self.per_move_rewards = per_move_rewards
+        self.final_reward_score_difference = final_reward_score_difference
+        self.with_hashes = with_hashes
+        self.actions = []
+        self.movers = []
+        self.hashes = [] if with_hashes else None
+
+    def __len__(self):
+        return len(self.actions)
+
+    def __eq__(self, other):
+        return isinstance(other, GameRecord) and self.to_bytes() == other.to_bytes()
+
+    # Keyword arguments to create an env with the same options as the recorded game
+    @property
+    def env_kwargs(self):
+        return {
+            "per_move_rewards": self.per_move_rewards,
+            "final_reward_score_difference": self.final_reward_score_difference,
+        }
+
+    def append(self, agent, action, position_hash=None):
+        if self.with_hashes and position_hash is None:
+            raise ValueError("This record stores position hashes, pass position_hash")
+        self.actions.append(int(action))
+        self.movers.append(AGENTS.index(agent))
+        if self.with_hashes:
+            self.hashes.append(int(position_hash))
+
+    # Steps the env (raw or wrapped) with the action of the agent to move, and records it
+    def record_step(self, env, action):
+        agent = env.agent_selection
+        env.step(action)
+        if action is None:
+            return
+        position_hash = None
+        if self.with_hashes:
+            position_hash = canonical_hash(env.unwrapped.board)
+        self.append(agent, action, position_hash)
+
+    def to_bytes(self):
+        flags = (
+            (FLAG_HASHES if self.with_hashes else 0)
+            | (FLAG_SEED if self.seed is not None else 0)
+            | (FLAG_PER_MOVE_REWARDS if self.per_move_rewards else 0)
+            | (
+                FLAG_FINAL_REWARD_SCORE_DIFFERENCE
+                if self.final_reward_score_difference
+                else 0
+            )
+        )
+        parts = [_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, flags)]
+        if self.seed is not None:
+            parts.append(_SEED.pack(self.seed))
+        parts.append(_NUM_PLIES.pack(len(self.actions)))
+        parts.append(np.asarray(self.actions, dtype="<u2").tobytes())
+        parts.append(np.packbits(np.asarray(self.movers, dtype=np.uint8)).tobytes())
+        if self.with_hashes:
+            parts.append(np.asarray(self.hashes, dtype="<u8").tobytes())
+        return b"".join(parts)
+
+    # Parses a record starting at offset, returns (record, offset of the next record)
+    @classmethod
+    def from_buffer(cls, data, offset=0):
+        magic, version, flags = _HEADER.unpack_from(data, offset)
+        if magic != RECORD_MAGIC:
+            raise ValueError(f"Not a game record (magic {magic!r} at offset {offset})")
+        if version != RECORD_VERSION:
+            raise ValueError(f"Unsupported game record version {version}")
+        offset += _HEADER.size
+
+        seed = None
+        if flags & FLAG_SEED:
+            (seed,) = _SEED.unpack_from(data, offset)
+            offset += _SEED.size
+        (num_plies,) = _NUM_PLIES.unpack_from(data, offset)
+        offset += _NUM_PLIES.size
+
+        record = cls(
+            seed=seed,
+            per_move_rewards=bool(flags & FLAG_PER_MOVE_REWARDS),
+            final_reward_score_difference=bool(
+                flags & FLAG_FINAL_REWARD_SCORE_DIFFERENCE
+            ),
+            with_hashes=bool(flags & FLAG_HASHES),
+        )
+        record.actions = np.frombuffer(
+            data, dtype="<u2", count=num_plies, offset=offset
+        ).tolist()
+        offset += 2 * num_plies
+        num_mover_bytes = (num_plies + 7) // 8
+        movers = np.frombuffer(
+            data, dtype=np.uint8, count=num_mover_bytes, offset=offset
+        )
+        record.movers = np.unpackbits(movers, count=num_plies).tolist()
+        offset += num_mover_bytes
+        if record.with_hashes:
+            record.hashes = np.frombuffer(
+                data, dtype="<u8", count=num_plies, offset=offset
+            ).tolist()
+            offset += 8 * num_plies
+        return record, offset
+
+    @classmethod
+    def from_bytes(cls, data):
+        record, _ = cls.from_buffer(data)
+        return record
+
+
+# Parses every record in a buffer of concatenated records
+def iter_records(data):
+    offset = 0
+    while offset < len(data):
+        record, offset = GameRecord.from_buffer(data, offset)
+        yield record
+
+
+def save_records(path, records):
+    with open(path, "wb") as f:
+        for record in records:
+            f.write(record.to_bytes())
+
+
+def load_records(path):
+    with open(path, "rb") as f:
+        return list(iter_records(f.read()))
+
+
+class GameReplayer:
+    """
+    Rebuilds positions of recorded games from their action lists
+    Boards are advanced with play_turn and check_territory only (no legal move calculation for skipped plies),
+    and positions are loaded into a single raw_env with reset(options={"state": ...}) when an observation is needed
+    Replaying plies in increasing order continues from the previous position instead of starting over
+    """
+
+    def __init__(self, record=None):
+        self.env = raw_env()
+        self.record = None
+        if record is not None:
+            self.load(record)
+
+    def load(self, record):
+        self.record = record
+        self._restart()
+
+    def _restart(self):
+        self.board = Board()
+        self.ply = 0
+        self.turns = {agent: 0 for agent in AGENTS}
+        self.score = {
+            agent: {
+                "squares_per_turn": 0,
+                "remaining_pieces": 0,
+                "territory": 0,
+                "total": 0,
+            }
+            for agent in AGENTS
+        }
+
+    # Advances the board to the position after the given number of plies
+    def seek(self, ply):
+        if not 0 <= ply <= len(self.record):
+            raise IndexError(
+                f"Ply {ply} out of range for a {len(self.record)} ply game"
+            )
+        if ply < self.ply:
+            self._restart()
+        while self.ply < ply:
+            agent = AGENTS[self.record.movers[self.ply]]
+            piece_size = self.board.play_turn(agent, self.record.actions[self.ply])
+            self.board.check_territory(agent)
+            if piece_size != 6:
+                self.turns[agent] += 1
+            self.ply += 1
+            # Score heuristics follow raw_env.step, which updates them when both agents played the same number of
+            # turns, and once more when the game is over
+            if self.turns[AGENTS[0]] == self.turns[AGENTS[1]] or (
+                self.ply == len(self.record)
+                and not any(self.board.has_legal_move(a) for a in AGENTS)
+            ):
+                update_score(self.score, self.board, self.turns, AGENTS)
+        return self.board
+
+    # Agent to move at the given ply (the last agent to move once the game is over)
+    def agent_at(self, ply):
+        if len(self.record) == 0:
+            return AGENTS[0]
+        return AGENTS[self.record.movers[min(ply, len(self.record) - 1)]]
+
+    # Position hash after the given ply, comparable with the hashes stored in the record
+    # (the side to move is not part of the hash, it is stored separately in the record)
+    def position_hash(self, ply):
+        return canonical_hash(self.seek(ply + 1))
+
+    # Loads the position at the given ply into self.env and returns it
+    # The env is ready to observe or step with the replayed score heuristics, but rewards are not replayed
+    # (use env_at for an exact replay)
+    def load_env(self, ply):
+        board = self.seek(ply)
+        self.env.reset(
+            options={
+                "state": {
+                    "board": board.get_state(),
+                    "turns": dict(self.turns),
+                    "agent_selection": self.agent_at(ply),
+                    "selector_agent": AGENTS[ply % 2],
+                    "score": self.score,
+                }
+            }
+        )
+        return self.env
+
+    # observe() output of the agent to move at the given ply
+    def observe(self, ply):
+        return self.load_env(ply).observe(self.agent_at(ply))
+
+    # Stacked observations (N, 10, 10, 5) and action masks (N, num_actions), row i is plies[i] (default: every move)
+    def observations(self, plies=None):
+        if plies is None:
+            plies = range(len(self.record))
+        plies = np.asarray(plies, dtype=np.int64)
+        observations = np.zeros((len(plies), 10, 10, 5), dtype=np.int8)
+        action_masks = np.zeros((len(plies), self.board.num_actions), dtype=np.int8)
+        # Plies are visited in increasing order so that seek() keeps replaying forward, rows keep the given order
+        for i in np.argsort(plies, kind="stable"):
+            obs = self.observe(int(plies[i]))
+            observations[i] = obs["observation"]
+            action_masks[i] = obs["action_mask"]
+        return observations, action_masks
+
+    # Exact replay through raw_env.step with the recorded options (rewards, scores and winner included)
+    def env_at(self, ply=None):
+        ply = len(self.record) if ply is None else ply
+        env = raw_env(**self.record.env_kwargs)
+        env.reset(seed=self.record.seed)
+        # Legal moves of the first agent are calculated by its first observation (needed for per-move rewards)
+        env.observe(env.agent_selection)
+        for action in self.record.actions[:ply]:
+            env.step(action)
+        return env
+
+    # Checks the stored position hashes against the replayed positions, returns the first mismatching ply or None
+    def verify(self):
+        if not self.record.with_hashes:
+            raise ValueError("This record does not store position hashes")
+        for ply, expected in enumerate(self.record.hashes):
+            if self.position_hash(ply) != expected:
+                return ply
+        return None
+
+
+# Observations and action masks of many records: lists of (observations, action_masks), one per record
+# plies: optional list with the plies to observe in each record (default: every move)
+def replay_batch(records, plies=None):
+    replayer = GameReplayer()
+    results = []
+    for i, record in enumerate(records):
+        replayer.load(record)
+        results.append(replayer.observations(None if plies is None else plies[i]))
+    return results
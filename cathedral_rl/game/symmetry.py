@@ -0,0 +1,195 @@
+import functools
+import hashlib
+
+import numpy as np
+
+from .board import Board
+
+# The 8 symmetries of the square board, as functions of the coordinates (x, y)
+SYMMETRIES = {
+    "identity": lambda x, y: (x, y),
+    "rot90": lambda x, y: (y, 9 - x),
+    "rot180": lambda x, y: (9 - x, 9 - y),
+    "rot270": lambda x, y: (9 - y, x),
+    "flip_x": lambda x, y: (9 - x, y),
+    "flip_y": lambda x, y: (x, 9 - y),
+    "transpose": lambda x, y: (y, x),
+    "anti_transpose": lambda x, y: (9 - y, 9 - x),
+}
+SYMMETRY_NAMES = tuple(SYMMETRIES.keys())
+
+
+# Maps each square (flat row major index) to the square it is moved to by the symmetry
+def cell_permutation(symmetry):
+    x, y = np.divmod(np.arange(100), 10)
+    new_x, new_y = SYMMETRIES[symmetry](x, y)
+    return 10 * new_x + new_y
+
+
+class SymmetryTables:
+    """
+    Precomputed action index permutations for every board symmetry, derived from Board.points
+    A symmetry is valid for an agent if it maps every placement of each piece onto a placement of the same piece
+    Reflections map chiral pieces (Abbey, Academy) onto their mirror images, so they are only valid if that
+    mirrored shape is among the placements of the same piece (otherwise they are left out)
+    """
+
+    def __init__(self, board):
+        self.possible_agents = board.possible_agents
+        self.num_actions = board.num_actions
+
+        # self.cell_maps[s][square] = square after applying symmetry s, self.inverse_cell_maps[s] is the inverse
+        self.cell_maps = np.stack([cell_permutation(name) for name in SYMMETRY_NAMES])
+        self.inverse_cell_maps = np.argsort(self.cell_maps, axis=1)
+
+        # self.action_permutations[agent][s][action] = action after applying symmetry s
+        self.action_permutations = {}
+        # self.valid_symmetries[agent] = indices (into SYMMETRY_NAMES) of symmetries valid for this agent
+        self.valid_symmetries = {}
+        for agent in self.possible_agents:
+            self.action_permutations[agent] = {}
+            cells, pieces = self._action_cells(board, agent)
+            # Lookup from (piece, packed occupied squares) to the action placing that piece on those squares
+            lookup = {
+                (piece, key.tobytes()): action
+                for action, (piece, key) in enumerate(
+                    zip(pieces, np.packbits(cells, axis=1))
+                )
+            }
+            for s in range(len(SYMMETRY_NAMES)):
+                moved = np.packbits(cells[:, self.inverse_cell_maps[s]], axis=1)
+                permutation = [
+                    lookup.get((piece, key.tobytes()), -1)
+                    for piece, key in zip(pieces, moved)
+                ]
+                if -1 not in permutation:
+                    permutation = np.array(permutation, dtype=np.int64)
+                    permutation.flags.writeable = False
+                    self.action_permutations[agent][s] = permutation
+            self.valid_symmetries[agent] = sorted(self.action_permutations[agent])
+
+        # self.inverse_action_permutations[agent][s][action] = action before applying symmetry s
+        self.inverse_action_permutations = {
+            agent: {
+                s: np.argsort(permutation)
+                for s, permutation in self.action_permutations[agent].items()
+            }
+            for agent in self.possible_agents
+        }
+
+        # Symmetries valid for both agents (used for canonical positions)
+        self.common_symmetries = sorted(
+            set.intersection(*[set(v) for v in self.valid_symmetries.values()])
+        )
+
+    # Occupancy (num_actions, 100) of each action and the piece each action places
+    # Pieces an agent does not own (e.g., player_1 and the cathedral) use player_0's placements
+    @staticmethod
+    def _action_cells(board, agent):
+        cells = np.zeros((board.num_actions, 100), dtype=bool)
+        pieces = board.codec.pieces.tolist()
+        for action, piece in enumerate(pieces):
+            action_num = board.codec.action_nums[action]
+            owner = agent if piece in board.points[agent] else board.possible_agents[0]
+            for x, y in board.points[owner][piece][action_num]:
+                cells[action, 10 * x + y] = True
+        return cells, pieces
+
+    def symmetry_index(self, symmetry):
+        return SYMMETRY_NAMES.index(symmetry) if isinstance(symmetry, str) else symmetry
+
+    # Transforms a batch of observations (..., 10, 10, C), action masks (..., num_actions) and actions (...)
+    # by a single symmetry (name or index), returns (observations, action_masks, actions)
+    def transform(self, agent, observations, action_masks, actions, symmetry):
+        s = self.symmetry_index(symmetry)
+        if s not in self.action_permutations[agent]:
+            raise ValueError(
+                f"Symmetry {SYMMETRY_NAMES[s]} does not map {agent}'s pieces onto themselves"
+            )
+        permutation = self.action_permutations[agent][s]
+
+        observations = np.asarray(observations)
+        shape = observations.shape
+        flat = observations.reshape(shape[:-3] + (100, shape[-1]))
+        observations = flat[..., self.inverse_cell_maps[s], :].reshape(shape)
+
+        action_masks = np.asarray(action_masks)
+        new_action_masks = np.empty_like(action_masks)
+        new_action_masks[..., permutation] = action_masks
+
+        actions = permutation[np.asarray(actions)]
+        return observations, new_action_masks, actions
+
+    # Applies every valid symmetry (or the given list of symmetries) to a batch at once
+    # Returns arrays with a new leading dimension of size len(symmetries): (S, ...) for each input
+    def augment(self, agent, observations, action_masks, actions, symmetries=None):
+        if symmetries is None:
+            symmetries = self.valid_symmetries[agent]
+        results = [
+            self.transform(agent, observations, action_masks, actions, s)
+            for s in symmetries
+        ]
+        return tuple(np.stack(arrays) for arrays in zip(*results))
+
+
+# Position planes (3, 100) uint8 used for canonical forms:
+# squares (owner of each square), territory of empty squares (+1, territory under pieces is not part of the position)
+# and the index (+1) of the piece occupying each square (the same squares can be covered by different pieces)
+def position_planes(board):
+    planes = np.zeros((3, 100), dtype=np.uint8)
+    planes[0] = board.squares
+    empty = board.squares == 0
+    # Territory of regions which border no pieces is NaN, encoded as 4
+    planes[1][empty] = np.nan_to_num(board.territory[empty], nan=3) + 1
+    piece_plane = planes[2]
+    for agent in board.possible_agents:
+        for piece_idx, piece in enumerate(board.pieces[agent]):
+            if piece.placed:
+                for x, y in piece.points:
+                    piece_plane[10 * x + y] = piece_idx + 1
+    return planes
+
+
+# Canonical position key under the symmetries valid for both agents (minimal variant of the position planes)
+# Returns (key, symmetry): key is a bytes object identifying the position up to symmetry (unplaced pieces and
+# the side to move included), symmetry is the index of the symmetry taking the board to its canonical variant
+def canonical_form(board, agent=None, tables=None):
+    tables = tables or get_symmetry_tables()
+    symmetries = tables.common_symmetries
+    # All symmetric variants gathered at once: (num_symmetries, 3 * 100)
+    variants = position_planes(board)[:, tables.inverse_cell_maps[symmetries]]
+    variants = variants.transpose(1, 0, 2).tobytes()
+    size = len(variants) // len(symmetries)
+    variant, symmetry = min(
+        (variants[i * size : (i + 1) * size], s) for i, s in enumerate(symmetries)
+    )
+    # Unplaced pieces of each agent as 16 bit masks
+    unplaced = b"".join(
+        sum(1 << int(piece) for piece in board.unplaced_pieces[a]).to_bytes(2, "little")
+        for a in board.possible_agents
+    )
+    side = board.possible_agents.index(agent) if agent in board.possible_agents else 255
+    return variant + unplaced + bytes([side]), symmetry
+
+
+# 64-bit hash of the canonical position, stable across processes (usable as a cache or dataset dedup key)
+def canonical_hash(board, agent=None, tables=None):
+    key, _ = canonical_form(board, agent, tables)
+    return hash_key(key)
+
+
+def hash_key(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+# Symmetry tables are identical for every board, so they are computed once per process
+@functools.lru_cache(maxsize=None)
+def get_symmetry_tables():
+    return SymmetryTables(Board())
+
+
+# Vectorized data augmentation for (observation, action_mask, action) batches of a single agent
+def augment(agent, observations, action_masks, actions, symmetries=None):
+    return get_symmetry_tables().augment(
+        agent, observations, action_masks, actions, symmetries
+    )
@@ -5,8 +5,6 @@ import time
 # from https://github.com/michaelfeil/skyjo_rl/blob/dev/rlskyjo/utils.py
 from pathlib import Path
 
-import pygame
-
 
 # Refactored to just do the current directory
 def get_project_root() -> Path:
@@ -46,6 +44,8 @@ class GIFRecorder:
         """
             Note: surface must have the dimensions specified in the constructor.
         """
+        import pygame
+
         if not self.ended:  # Stop saving frames after we have exported the recording
             # transform the pixels to the format used by open-cv
             self.filename_list.append(
@@ -0,0 +1,292 @@
+"""
+Allocation audit for reset, step and observe, using tracemalloc on the seeded positions of cathedral_rl.benchmark
+
+    python -m cathedral_rl.memory_audit --top 10
+    python -m cathedral_rl.memory_audit --check
+
+For each operation, reports per call:
+    peak: largest amount of memory allocated at once during the call (temporary arrays and lists included)
+    net: bytes and blocks still allocated after the call (returned values and state kept by the env), by source line
+tracemalloc only sees allocations which are alive when a snapshot is taken, so temporaries freed during the call
+count towards the peak but not towards the per-line breakdown.
+
+--check runs each operation repeatedly on the same position (steady state) and exits with status 1 if memory keeps
+growing, i.e., if the net allocation per call is above --tolerance bytes. This is the zero-allocation target that
+optimizations are checked against: repeating an operation should not retain any new memory.
+It also exits with status 1 if the peak allocation per call of an operation is above its budget in PEAK_BUDGETS,
+which catches new temporary arrays and lists in the hot paths even when they are freed before the call returns.
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+
+from cathedral_rl.benchmark import get_positions
+from cathedral_rl.game.cathedral import raw_env
+
+DEFAULT_REPEAT = 20
+DEFAULT_STEADY_STATE_REPEAT = 20
+
+# Recorded peak allocation budgets in bytes per call, with headroom over the largest peak of the seeded positions
+# (measured peaks: reset 14.9 KB, step 8.1 KB with the territory cache disabled, observe 5.2 KB)
+# The budgets depend on the Python and numpy builds, they are only checked by --check
+PEAK_BUDGETS = {"reset": 20_000, "step": 12_000, "observe": 8_000}
+
+# Allocations made by tracemalloc itself (snapshots) are not part of the audit
+_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__)]
+
+
+# Operations to audit: name -> (env, position) -> (setup, fn), setup() is called before fn() and is not audited
+def _reset(env, position):
+    return None, env.reset
+
+
+def _step(env, position):
+    def setup():
+        env.reset(options={"state": position.state})
+        env.observe(env.agent_selection)
+
+    return setup, lambda: env.step(position.action)
+
+
+def _observe(env, position):
+    env.reset(options={"state": position.state})
+    agent = env.agent_selection
+    env.observe(agent)
+    return None, lambda: env.observe(agent)
+
+
+OPERATIONS = {"reset": _reset, "step": _step, "observe": _observe}
+
+
+class AllocationReport:
+    """
+    Per call allocation statistics of an operation, averaged over repeated calls
+    """
+
+    def __init__(self, name, calls, peak_bytes, net_bytes, net_blocks, lines):
+        self.name = name
+        self.calls = calls
+        self.peak_bytes = peak_bytes
+        self.net_bytes = net_bytes
+        self.net_blocks = net_blocks
+        # [(bytes per call, blocks per call, "file:line"), ...] sorted by bytes
+        self.lines = lines
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "peak_bytes": self.peak_bytes,
+            "net_bytes": self.net_bytes,
+            "net_blocks": self.net_blocks,
+            "lines": [
+                {"bytes": b, "blocks": n, "line": line} for b, n, line in self.lines
+            ],
+        }
+
+    def format(self, top=10):
+        lines = [
+            f"{self.name}: peak {self.peak_bytes:,.0f} B/call, "
+            f"net {self.net_bytes:,.0f} B/call in {self.net_blocks:,.1f} blocks/call"
+        ]
+        for size, count, line in self.lines[:top]:
+            lines.append(f"  {size:12,.0f} B {count:8.1f} blocks  {line}")
+        return "\n".join(lines)
+
+
+# Audits repeated calls of fn (tracemalloc must be tracing), returns an AllocationReport
+def audit(name, fn, setup=None, repeat=DEFAULT_REPEAT, warmup=3):
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        fn()
+    # Filtering compiles and caches patterns the first time, keep this out of the audit
+    tracemalloc.take_snapshot().filter_traces(_FILTERS)
+
+    peak_total = 0
+    by_line = {}
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        before = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        del result
+        peak_total += peak - start
+        for stat in after.compare_to(before, "lineno"):
+            if stat.size_diff or stat.count_diff:
+                frame = stat.traceback[0]
+                key = f"{frame.filename}:{frame.lineno}"
+                size, count = by_line.get(key, (0, 0))
+                by_line[key] = (size + stat.size_diff, count + stat.count_diff)
+
+    lines = sorted(
+        (
+            (size / repeat, count / repeat, line)
+            for line, (size, count) in by_line.items()
+        ),
+        reverse=True,
+    )
+    return AllocationReport(
+        name,
+        repeat,
+        peak_total / repeat,
+        sum(size for size, _, _ in lines),
+        sum(count for _, count, _ in lines),
+        lines,
+    )
+
+
+# Net memory retained per call when calling fn repeatedly on the same position (0 in a steady state)
+# Batches of repeat and 2 * repeat calls are compared, so that memory retained once per batch cancels out
+# One-off allocations (interpreter free lists, dict resizes) take a few batches to settle, while memory retained
+# by every call shows up in every comparison, so the smallest of several comparisons is returned
+def steady_state_growth(fn, setup=None, repeat=DEFAULT_STEADY_STATE_REPEAT, rounds=3):
+    def run_batch(calls):
+        gc.collect()
+        start, _ = tracemalloc.get_traced_memory()
+        for _ in range(calls):
+            if setup is not None:
+                setup()
+            fn()
+        gc.collect()
+        end, _ = tracemalloc.get_traced_memory()
+        return end - start
+
+    run_batch(repeat)
+    return min(
+        (run_batch(2 * repeat) - run_batch(repeat)) / repeat for _ in range(rounds)
+    )
+
+
+def run_audit(repeat=DEFAULT_REPEAT, operations=None, positions=None):
+    positions = positions if positions is not None else get_positions()
+    reports = []
+    for op_name, operation in OPERATIONS.items():
+        if operations and op_name not in operations:
+            continue
+        for position in positions:
+            env = raw_env()
+            env.reset()
+            setup, fn = operation(env, position)
+            reports.append(audit(f"{op_name}/{position.name}", fn, setup, repeat))
+    return reports
+
+
+# Returns {"operation/position": bytes retained per call} for operations above the tolerance
+def run_check(
+    repeat=DEFAULT_STEADY_STATE_REPEAT, tolerance=0, operations=None, positions=None
+):
+    positions = positions if positions is not None else get_positions()
+    failures = {}
+
+    # The first measurements after tracing starts include one-off allocations, warm up with a cheap operation
+    env = raw_env()
+    env.reset()
+    steady_state_growth(env.reset, repeat=repeat)
+
+    for op_name, operation in OPERATIONS.items():
+        if operations and op_name not in operations:
+            continue
+        for position in positions:
+            env = raw_env()
+            env.reset()
+            setup, fn = operation(env, position)
+            growth = steady_state_growth(fn, setup, repeat)
+            name = f"{op_name}/{position.name}"
+            print(f"{name:24s} {growth:10,.1f} B/call retained")
+            if growth > tolerance:
+                failures[name] = growth
+    return failures
+
+
+# Returns {"operation/position": (peak bytes per call, budget)} for audited operations above their peak budget
+def check_peak_budgets(reports, budgets=None):
+    budgets = budgets if budgets is not None else PEAK_BUDGETS
+    failures = {}
+    for report in reports:
+        budget = budgets.get(report.name.split("/")[0])
+        if budget is not None and report.peak_bytes > budget:
+            failures[report.name] = (report.peak_bytes, budget)
+    return failures
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Audit memory allocations of reset, step and observe with tracemalloc."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=None, help="Number of audited calls."
+    )
+    parser.add_argument(
+        "--operations",
+        type=str,
+        nargs="*",
+        default=None,
+        choices=sorted(OPERATIONS.keys()),
+        help="Operations to audit (default: all).",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="Number of source lines to print per operation.",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Check that repeated calls on the same position retain no memory, and that peak allocations per "
+        "call are within PEAK_BUDGETS.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0,
+        help="Bytes per call which repeated calls may retain in --check mode.",
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+
+    # Positions and precalculated action tables are created before tracing starts
+    positions = get_positions()
+    raw_env().reset()
+
+    tracemalloc.start()
+    try:
+        if args.check:
+            failures = run_check(
+                args.repeat or DEFAULT_STEADY_STATE_REPEAT,
+                args.tolerance,
+                args.operations,
+                positions,
+            )
+            for name, growth in failures.items():
+                print(f"FAIL {name}: retains {growth:,.1f} B/call")
+            reports = run_audit(
+                args.repeat or DEFAULT_REPEAT, args.operations, positions
+            )
+            for report in reports:
+                print(f"{report.name:24s} {report.peak_bytes:10,.1f} B/call peak")
+            over_budget = check_peak_budgets(reports)
+            for name, (peak, budget) in over_budget.items():
+                print(f"FAIL {name}: peak {peak:,.0f} B/call (budget {budget:,} B)")
+            return 1 if failures or over_budget else 0
+
+        for report in run_audit(
+            args.repeat or DEFAULT_REPEAT, args.operations, positions
+        ):
+            print(report.format(args.top) + "\n")
+        return 0
+    finally:
+        tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
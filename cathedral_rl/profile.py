@@ -0,0 +1,202 @@
+"""
+Profiling harness: plays seeded games with built-in policies (rendering off) under cProfile and a stack sampler
+
+    python -m cathedral_rl.profile --games 5 --policy greedy --output profile_output
+
+Writes to the output directory:
+    cathedral.prof: cProfile stats (open with pstats, snakeviz, ...)
+    cathedral.collapsed: sampled stacks in collapsed format ("frame;frame;frame count"), for flamegraph.pl or speedscope
+and prints the functions with the most self time in each subsystem (env, policies, board, wrappers)
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from cathedral_rl import cathedral_v0
+from cathedral_rl.game.policies import POLICIES, get_policy
+
+# Subsystems, by the source files of their functions (checked in order, paths use "/" separators)
+SUBSYSTEMS = {
+    "env": ["cathedral_rl/game/cathedral.py"],
+    "policies": ["cathedral_rl/game/policies.py"],
+    "board": ["cathedral_rl/game/"],
+    "wrappers": ["pettingzoo/utils/"],
+}
+
+
+def get_subsystem(filename):
+    filename = filename.replace(os.sep, "/")
+    for subsystem, paths in SUBSYSTEMS.items():
+        if any(path in filename for path in paths):
+            return subsystem
+    return "other"
+
+
+# Plays seeded games with the wrapped env (as used in training), rendering off
+def play_games(num_games, policy="random", opponent_policy=None, seed=0):
+    env = cathedral_v0.env()
+    for game in range(num_games):
+        env.reset()
+        policies = {
+            agent: get_policy(name, env, seed + 2 * game + i)
+            for i, (agent, name) in enumerate(
+                zip(env.possible_agents, [policy, opponent_policy or policy])
+            )
+        }
+        while env.agents:
+            observation, reward, termination, truncation, info = env.last()
+            agent = env.agent_selection
+            if termination or truncation:
+                action = None
+            else:
+                action = policies[agent](observation, agent)
+            env.step(action)
+    env.close()
+
+
+class StackSampler:
+    """
+    Samples the call stack of a thread at a fixed interval from a background thread
+    Counts are keyed by collapsed stacks: "file:function;file:function;..." from the outermost frame
+    """
+
+    def __init__(self, interval=0.001, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.counts = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stopped.set()
+        self._thread.join()
+
+    def write_collapsed(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# Functions with the most self time per subsystem: {subsystem: [(self time, calls, "file:line(function)"), ...]}
+# top=None returns every function
+def top_self_time(stats, top=10):
+    by_subsystem = {}
+    for (filename, line, name), (_, calls, self_time, _, _) in stats.stats.items():
+        by_subsystem.setdefault(get_subsystem(filename), []).append(
+            (self_time, calls, f"{os.path.basename(filename)}:{line}({name})")
+        )
+    return {
+        subsystem: sorted(functions, reverse=True)[:top]
+        for subsystem, functions in by_subsystem.items()
+    }
+
+
+def print_top_self_time(stats, top=10):
+    total = stats.total_tt
+    functions = top_self_time(stats, top=None)
+    for subsystem in list(SUBSYSTEMS) + ["other"]:
+        if subsystem not in functions:
+            continue
+        subsystem_time = sum(t for t, _, _ in functions[subsystem])
+        print(
+            f"\n{subsystem}: {subsystem_time:.3f}s self time ({subsystem_time / total:.0%} of total)"
+        )
+        for self_time, calls, function in functions[subsystem][:top]:
+            print(f"  {self_time:9.3f}s {calls:10d} calls  {function}")
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Profile seeded Cathedral games with cProfile and a stack sampler."
+    )
+    parser.add_argument("--games", type=int, default=5, help="Number of games to play.")
+    parser.add_argument(
+        "--policy",
+        type=str,
+        default="random",
+        choices=sorted(POLICIES.keys()),
+        help="Policy used by player_0 (and player_1 unless --opponent-policy is set).",
+    )
+    parser.add_argument(
+        "--opponent-policy",
+        type=str,
+        default=None,
+        choices=sorted(POLICIES.keys()),
+        help="Policy used by player_1.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Set random seed.")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="profile_output",
+        help="Directory to write profiling results to.",
+    )
+    parser.add_argument(
+        "--sample-interval",
+        type=float,
+        default=1.0,
+        help="Stack sampling interval in milliseconds.",
+    )
+    parser.add_argument(
+        "--no-sampling",
+        action="store_true",
+        help="Skip the stack sampling run (only run cProfile).",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="Number of functions to print per subsystem.",
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    os.makedirs(args.output, exist_ok=True)
+    games = (args.games, args.policy, args.opponent_policy, args.seed)
+
+    # Action tables are precalculated once per process, keep this out of the profile
+    cathedral_v0.env().reset()
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.runcall(play_games, *games)
+    print(f"Profiled {args.games} games in {time.perf_counter() - start:.1f}s")
+    prof_path = os.path.join(args.output, "cathedral.prof")
+    profiler.dump_stats(prof_path)
+    stats = pstats.Stats(profiler)
+    print_top_self_time(stats, args.top)
+    print(f"\nWrote cProfile stats to {prof_path}")
+
+    # Sampling runs separately: cProfile's overhead would distort the sampled stacks
+    if not args.no_sampling:
+        with StackSampler(args.sample_interval / 1000) as sampler:
+            play_games(*games)
+        collapsed_path = os.path.join(args.output, "cathedral.collapsed")
+        sampler.write_collapsed(collapsed_path)
+        print(f"Wrote {sum(sampler.counts.values())} stack samples to {collapsed_path}")
+
+
+if __name__ == "__main__":
+    main()
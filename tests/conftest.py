@@ -0,0 +1,89 @@
+import functools
+
+import numpy as np
+import pytest
+
+from cathedral_rl.game.cathedral import raw_env
+
+
+# Tests marked slow (the tracemalloc audits) only run with --runslow
+def pytest_addoption(parser):
+    parser.addoption("--runslow", action="store_true", help="Run the slow tests.")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: only run with --runslow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--runslow"):
+        return
+    skip = pytest.mark.skip(reason="slow, run with --runslow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
+
+
+# Moves [(agent, action), ...] of a seeded random game (env options do not change which moves are legal)
+@functools.lru_cache(maxsize=None)
+def _random_game(seed):
+    rng = np.random.default_rng(seed)
+    env = raw_env()
+    env.reset(seed=seed)
+    moves = []
+    while env.agents:
+        agent = env.agent_selection
+        mask = env.observe(agent)["action_mask"]
+        moves.append((agent, int(rng.choice(np.flatnonzero(mask)))))
+        env.step(moves[-1][1])
+    return tuple(moves)
+
+
+# Plays moves on an env (raw, fast or wrapped), observing each position first as an agent loop would
+def _play(env, moves):
+    for agent, action in moves:
+        assert env.agent_selection == agent
+        env.observe(agent)
+        env.step(action)
+    return env
+
+
+# Everything the rest of a game can change: winner, rewards, score, terminations and the final board
+def _outcome(env):
+    env = env.unwrapped
+    return (
+        env.winner,
+        env.rewards,
+        env._cumulative_rewards,
+        env.score,
+        env.terminations,
+        env.board.squares.tolist(),
+    )
+
+
+@pytest.fixture(scope="session")
+def random_game():
+    return _random_game
+
+
+@pytest.fixture(scope="session")
+def play():
+    return _play
+
+
+@pytest.fixture(scope="session")
+def outcome():
+    return _outcome
+
+
+# Env after a cathedral placement enclosing a region, whose territory is NaN (it borders no player pieces)
+@pytest.fixture
+def nan_territory_env():
+    env = raw_env()
+    env.reset()
+    for action in np.flatnonzero(env.observe(env.agent_selection)["action_mask"]):
+        env.reset()
+        env.step(int(action))
+        if np.isnan(env.board.territory).any():
+            return env
+    raise AssertionError("No cathedral placement with NaN territory found")
@@ -0,0 +1,27 @@
+import pytest
+
+from cathedral_rl.dataset import BatchPrefetcher
+
+
+# Stands in for a ShardedDataset whose sampling fails after a number of batches
+class FailingDataset:
+    def __init__(self, good_batches):
+        self.good_batches = good_batches
+
+    def allocate_batch(self, batch_size):
+        return {}
+
+    def sample(self, batch_size, rng=None, out=None):
+        if self.good_batches == 0:
+            raise OSError("shard unreadable")
+        self.good_batches -= 1
+        return out
+
+
+def test_prefetcher_raises_worker_error_on_every_call():
+    with BatchPrefetcher(FailingDataset(good_batches=1), batch_size=4) as batches:
+        next(batches)
+        for _ in range(3):
+            with pytest.raises(OSError, match="shard unreadable"):
+                next(batches)
+        assert not batches.thread.is_alive()
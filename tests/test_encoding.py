@@ -0,0 +1,34 @@
+import numpy as np
+
+from cathedral_rl import cathedral_v0
+from cathedral_rl.game.encoding import unpack_observation_dict
+
+
+def test_observe_packed_round_trip(random_game, play):
+    env = cathedral_v0.env().unwrapped
+    env.reset()
+    play(env, random_game(0)[:6])
+    for agent in env.agents:
+        packed = env.observe_packed(agent)
+        assert env.packed_observation_space(agent).contains(packed)
+        obs = unpack_observation_dict(packed, env.board.num_actions)
+        expected = env.observe(agent)
+        assert obs.keys() == expected.keys()
+        for key in expected:
+            np.testing.assert_array_equal(obs[key], expected[key])
+
+
+def test_observe_packed_hierarchical_piece_mask(random_game, play):
+    env = cathedral_v0.env(hierarchical_actions=True).unwrapped
+    env.reset()
+    play(env, random_game(0)[:6])
+    for agent in env.agents:
+        packed = env.observe_packed(agent)
+        assert env.packed_observation_space(agent).contains(packed)
+        obs = unpack_observation_dict(
+            packed, env.board.num_actions, num_pieces=env.board.num_pieces
+        )
+        expected = env.observe(agent)
+        assert obs.keys() == expected.keys()
+        for key in expected:
+            np.testing.assert_array_equal(obs[key], expected[key])
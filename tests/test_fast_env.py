@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from cathedral_rl.game.cathedral import env as wrapped_env
+from cathedral_rl.game.cathedral import fast_env
+
+
+# fast_env observes, rewards and ends games exactly like the wrapped env
+@pytest.mark.parametrize("kwargs", [{}, {"per_move_rewards": True}])
+def test_fast_env_matches_wrapped_env(random_game, kwargs):
+    envs = [wrapped_env(**kwargs), fast_env(**kwargs)]
+    for env in envs:
+        env.reset()
+    for agent, action in random_game(0):
+        (obs, *rest), (fast_obs, *fast_rest) = [env.last() for env in envs]
+        np.testing.assert_array_equal(obs["action_mask"], fast_obs["action_mask"])
+        np.testing.assert_array_equal(obs["observation"], fast_obs["observation"])
+        assert rest == fast_rest
+        for env in envs:
+            env.step(action)
+    assert envs[0].unwrapped.winner == envs[1].winner
+    assert envs[0].rewards == envs[1].rewards
+
+
+def test_fast_env_illegal_move_matches_wrapped_env():
+    envs = [wrapped_env(), fast_env()]
+    for env in envs:
+        env.reset()
+        mask = env.last()[0]["action_mask"]
+        env.step(int(np.flatnonzero(mask == 0)[0]))
+    assert envs[0].rewards == envs[1].rewards
+    assert envs[0].terminations == envs[1].terminations
+    assert envs[0].agent_selection == envs[1].agent_selection
+
+
+# An illegal move is a timed step too, which does not leak into the timing of the next step
+def test_step_timing_closed_after_illegal_move():
+    env = fast_env(step_timing=True)
+    env.reset()
+    mask = env.observe(env.agent_selection)["action_mask"]
+    env.step(int(np.flatnonzero(mask == 0)[0]))
+    stats = env.step_timing_stats()
+    assert stats["steps"] == 1
+    assert set(stats["last"]) == {"is_legal", "total"}
+
+    env.reset()
+    mask = env.observe(env.agent_selection)["action_mask"]
+    env.step(int(np.flatnonzero(mask)[0]))
+    stats = env.step_timing_stats()
+    assert stats["steps"] == 2
+    assert stats["last"]["total"] >= stats["last"]["play_turn"]
+    assert stats["cumulative"]["total"] >= stats["last"]["total"]
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from cathedral_rl.game.cathedral import raw_env
+from cathedral_rl.game.symmetry import get_symmetry_tables
+
+TABLES = get_symmetry_tables()
+
+
+# Legal moves of a cached env match an uncached env on the game and its rotations, which hit the cache entries of
+# the positions already seen (stored for the canonical variant and mapped back to each rotation)
+@pytest.mark.parametrize("seed", range(2))
+def test_legal_move_cache_on_rotated_replays(random_game, seed):
+    moves = random_game(seed)
+    cached_env = raw_env(legal_move_cache_bytes=1 << 24)
+    for s in TABLES.common_symmetries:
+        cached_env.reset()
+        env = raw_env()
+        env.reset()
+        for agent, action in moves:
+            cached_obs = cached_env.observe(agent)
+            obs = env.observe(agent)
+            np.testing.assert_array_equal(cached_obs["action_mask"], obs["action_mask"])
+            assert cached_env.legal_moves[agent] == env.legal_moves[agent]
+            np.testing.assert_array_equal(
+                cached_env.legal_moves_per_piece[agent],
+                env.legal_moves_per_piece[agent],
+            )
+            action = int(TABLES.action_permutations[agent][s][action])
+            cached_env.step(action)
+            env.step(action)
+        assert cached_env.winner == env.winner
+        assert cached_env.rewards == env.rewards
+    assert cached_env.legal_move_cache.stats()["hits"] >= 3 * len(moves)
+
+
+def test_legal_move_cache_stays_within_budget(random_game, play):
+    env = raw_env(legal_move_cache_bytes=4096)
+    env.reset()
+    play(env, random_game(0))
+    stats = env.legal_move_cache.stats()
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert stats["evictions"] > 0
@@ -0,0 +1,65 @@
+import tracemalloc
+
+import pytest
+
+from cathedral_rl.benchmark import get_positions
+from cathedral_rl.game.board import Board
+from cathedral_rl.game.cathedral import raw_env
+from cathedral_rl.memory_audit import run_audit, run_check
+
+# The exact peak budgets of PEAK_BUDGETS depend on the build and are only checked by the --check CLI, the peaks are
+# compared here with each other, as measured in this process
+pytestmark = pytest.mark.slow
+
+
+@pytest.fixture(scope="module")
+def positions():
+    # Positions and precalculated action tables are created before tracing starts
+    positions = get_positions()
+    raw_env().reset()
+    return positions
+
+
+@pytest.fixture
+def tracing():
+    tracemalloc.start()
+    yield
+    tracemalloc.stop()
+
+
+# Peak bytes per call {"operation/position": peak}, with and without the territory cache
+@pytest.fixture(scope="module")
+def peaks(positions):
+    peaks = {}
+    cache = Board.territory_cache
+    tracemalloc.start()
+    try:
+        for territory_cache in [True, False]:
+            Board.territory_cache = cache if territory_cache else None
+            reports = run_audit(repeat=5, positions=positions)
+            peaks[territory_cache] = {r.name: r.peak_bytes for r in reports}
+    finally:
+        Board.territory_cache = cache
+        tracemalloc.stop()
+    return peaks
+
+
+# Creating the board and the observation arrays is the largest allocation, step and observe only need temporaries
+@pytest.mark.parametrize("territory_cache", [True, False])
+def test_step_and_observe_peaks_below_reset(peaks, territory_cache):
+    reset_peak = min(
+        p for n, p in peaks[territory_cache].items() if n.startswith("reset")
+    )
+    for name, peak in peaks[territory_cache].items():
+        if not name.startswith("reset"):
+            assert peak < reset_peak, name
+
+
+def test_territory_cache_does_not_raise_step_peak(peaks, positions):
+    for position in positions:
+        name = f"step/{position.name}"
+        assert peaks[True][name] <= peaks[False][name], name
+
+
+def test_steady_state_retains_no_memory(positions, tracing):
+    assert run_check(repeat=5, positions=positions) == {}
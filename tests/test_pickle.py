@@ -0,0 +1,70 @@
+import pickle
+import warnings
+
+import numpy as np
+import pytest
+
+from cathedral_rl.game.cathedral import env as wrapped_env
+from cathedral_rl.game.cathedral import fast_env, raw_env
+from cathedral_rl.game.symmetry import canonical_hash
+
+ENV_FNS = [raw_env, fast_env, wrapped_env]
+
+
+def test_board_pickle_keeps_nan_territory(nan_territory_env):
+    board = nan_territory_env.board
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        restored = pickle.loads(pickle.dumps(board))
+    np.testing.assert_array_equal(restored.squares, board.squares)
+    np.testing.assert_array_equal(restored.territory, board.territory)
+    assert canonical_hash(restored) == canonical_hash(board)
+
+
+def test_env_pickle_keeps_nan_territory(nan_territory_env):
+    env = nan_territory_env
+    restored = pickle.loads(pickle.dumps(env))
+    np.testing.assert_array_equal(restored.board.territory, env.board.territory)
+    assert canonical_hash(restored.board) == canonical_hash(env.board)
+
+
+# Unpickling an env mid-game then playing the rest of the game gives the same outcome as playing the whole game
+@pytest.mark.parametrize("kwargs", [{}, {"per_move_rewards": True}])
+@pytest.mark.parametrize("env_fn", ENV_FNS)
+def test_continue_after_unpickle(random_game, play, outcome, env_fn, kwargs):
+    moves = random_game(0)
+    env = env_fn(**kwargs)
+    env.reset()
+    expected = outcome(play(env, moves))
+    for ply in [1, len(moves) // 2]:
+        env = env_fn(**kwargs)
+        env.reset()
+        play(env, moves[:ply])
+        unpickled = pickle.loads(pickle.dumps(env))
+        assert type(unpickled) is type(env)
+        assert outcome(play(unpickled, moves[ply:])) == expected
+
+
+# Pickles stay well under 1 KB, wrappers included (envs are shipped to workers by pickling, e.g. with Ray)
+@pytest.mark.parametrize("env_fn", ENV_FNS)
+def test_pickle_size(random_game, play, env_fn):
+    moves = random_game(0)
+    env = env_fn()
+    env.reset()
+    play(env, moves[: len(moves) // 2])
+    assert len(pickle.dumps(env)) < 1024
+
+
+# After an illegal move, the wrappers of env() hold the ended game (the raw env does not), which is pickled too
+def test_wrapped_env_pickle_after_illegal_move():
+    env = wrapped_env()
+    env.reset()
+    env.step(int(np.flatnonzero(env.last()[0]["action_mask"] == 0)[0]))
+    unpickled = pickle.loads(pickle.dumps(env))
+    assert unpickled.terminations == env.terminations
+    assert unpickled.rewards == env.rewards
+    assert unpickled.agent_selection == env.agent_selection
+    unpickled.step(None)
+    env.step(None)
+    assert unpickled.agents == env.agents
+    assert unpickled._cumulative_rewards == env._cumulative_rewards
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from cathedral_rl.game.cathedral import raw_env
+from cathedral_rl.game.records import (
+    GameRecord,
+    GameReplayer,
+    iter_records,
+    load_records,
+    replay_batch,
+    save_records,
+)
+
+
+def _record_game(moves, seed, with_hashes=False):
+    env = raw_env()
+    env.reset(seed=seed)
+    record = GameRecord(seed=seed, with_hashes=with_hashes)
+    for agent, action in moves:
+        record.record_step(env, action)
+    assert not env.agents
+    return record
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_load_env_matches_exact_replay(random_game, seed):
+    replayer = GameReplayer(_record_game(random_game(seed), seed))
+    for ply in range(len(replayer.record) + 1):
+        expected = replayer.env_at(ply)
+        env = replayer.load_env(ply)
+        assert env.score == expected.score
+        assert env.turns == expected.turns
+        np.testing.assert_array_equal(env.board.squares, expected.board.squares)
+
+
+def test_set_state_requires_known_selector_agent():
+    env = raw_env()
+    env.reset()
+    state = env.get_state()
+    state["selector_agent"] = "player_2"
+    with pytest.raises(ValueError):
+        env.reset(options={"state": state})
+
+
+def test_set_state_without_score_at_start():
+    env = raw_env()
+    env.reset()
+    state = env.get_state()
+    del state["score"]
+    env.reset(options={"state": state})
+    assert all(value == 0 for score in env.score.values() for value in score.values())
+
+
+@pytest.mark.parametrize("with_hashes", [False, True])
+def test_to_bytes_round_trip(random_game, with_hashes):
+    record = _record_game(random_game(0), 0, with_hashes=with_hashes)
+    restored = GameRecord.from_bytes(record.to_bytes())
+    assert restored == record
+    assert restored.actions == record.actions
+    assert restored.movers == record.movers
+    assert restored.hashes == record.hashes
+    assert restored.seed == record.seed
+
+
+def test_concatenated_records(random_game, tmp_path):
+    records = [
+        _record_game(random_game(seed), seed, with_hashes=seed % 2 == 1)
+        for seed in range(3)
+    ]
+    path = tmp_path / "games.bin"
+    save_records(path, records)
+    assert load_records(path) == records
+    assert list(iter_records(b"".join(r.to_bytes() for r in records))) == records
+
+
+def test_verify_replayed_hashes(random_game):
+    record = _record_game(random_game(1), 1, with_hashes=True)
+    record = GameRecord.from_bytes(record.to_bytes())
+    assert GameReplayer(record).verify() is None
+    # The replayed position no longer matches after a hash is changed
+    record.hashes[5] ^= 1
+    assert GameReplayer(record).verify() == 5
+
+
+def test_env_at_replays_winner_and_rewards(random_game, play):
+    record = _record_game(random_game(2), 2)
+    env = GameReplayer(GameRecord.from_bytes(record.to_bytes())).env_at()
+    assert not env.agents
+    expected = raw_env()
+    expected.reset(seed=2)
+    play(expected, random_game(2))
+    assert env.winner == expected.winner
+    assert env.rewards == expected.rewards
+
+
+# Rows follow the order of the requested plies, even when they are not sorted
+def test_observations_keep_ply_order(random_game):
+    record = _record_game(random_game(0), 0)
+    replayer = GameReplayer(record)
+    plies = [6, 2, 9, 2]
+    observations, action_masks = replayer.observations(plies)
+    for i, ply in enumerate(plies):
+        obs = replayer.observe(ply)
+        np.testing.assert_array_equal(observations[i], obs["observation"])
+        np.testing.assert_array_equal(action_masks[i], obs["action_mask"])
+    [(batch_observations, batch_action_masks)] = replay_batch([record], [plies])
+    np.testing.assert_array_equal(batch_observations, observations)
+    np.testing.assert_array_equal(batch_action_masks, action_masks)
@@ -0,0 +1,28 @@
+import pytest
+
+from cathedral_rl.game.cathedral import fast_env, raw_env
+
+ENV_KWARGS = [
+    {},
+    {"per_move_rewards": True},
+    {"final_reward_score_difference": True},
+]
+ENV_FNS = [raw_env, fast_env]
+
+
+# Restoring a mid-game state (get_state / reset(options={"state": ...})) then playing the rest of the game gives
+# the same outcome as playing the whole game
+@pytest.mark.parametrize("kwargs", ENV_KWARGS)
+@pytest.mark.parametrize("env_fn", ENV_FNS)
+def test_continue_after_restore(random_game, play, outcome, env_fn, kwargs):
+    moves = random_game(0)
+    env = env_fn(**kwargs)
+    env.reset()
+    expected = outcome(play(env, moves))
+    for ply in [0, 1, len(moves) // 2, len(moves) - 1]:
+        env = env_fn(**kwargs)
+        env.reset()
+        play(env, moves[:ply])
+        restored = env_fn(**kwargs)
+        restored.reset(options={"state": env.get_state()})
+        assert outcome(play(restored, moves[ply:])) == expected
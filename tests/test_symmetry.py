@@ -0,0 +1,101 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from cathedral_rl.game.cathedral import raw_env
+from cathedral_rl.game.symmetry import (
+    SYMMETRY_NAMES,
+    canonical_form,
+    canonical_hash,
+    get_symmetry_tables,
+    position_planes,
+)
+
+TABLES = get_symmetry_tables()
+
+
+def test_action_permutations_are_inverse():
+    for agent in TABLES.possible_agents:
+        assert 0 in TABLES.valid_symmetries[agent]
+        np.testing.assert_array_equal(
+            TABLES.action_permutations[agent][0], np.arange(TABLES.num_actions)
+        )
+        for s, permutation in TABLES.action_permutations[agent].items():
+            assert sorted(permutation) == list(range(TABLES.num_actions))
+            inverse = TABLES.inverse_action_permutations[agent][s]
+            np.testing.assert_array_equal(
+                inverse[permutation], np.arange(TABLES.num_actions)
+            )
+
+
+def test_cell_maps_are_symmetries_of_the_board():
+    for s, name in enumerate(SYMMETRY_NAMES):
+        assert sorted(TABLES.cell_maps[s]) == list(range(100))
+        np.testing.assert_array_equal(
+            TABLES.cell_maps[s][TABLES.inverse_cell_maps[s]], np.arange(100)
+        )
+
+
+# Replaying a game with every action moved by a common symmetry gives the moved positions: observations and action
+# masks match transform() of the original ones
+@pytest.mark.parametrize("seed", range(2))
+def test_symmetric_replay(random_game, seed):
+    moves = random_game(seed)
+    for s in TABLES.common_symmetries:
+        env = raw_env()
+        env.reset()
+        moved_env = raw_env()
+        moved_env.reset()
+        for agent, action in moves:
+            assert moved_env.agent_selection == agent
+            obs = env.observe(agent)
+            moved_obs = moved_env.observe(agent)
+            observation, action_mask, moved_action = TABLES.transform(
+                agent, obs["observation"], obs["action_mask"], action, s
+            )
+            np.testing.assert_array_equal(observation, moved_obs["observation"])
+            np.testing.assert_array_equal(action_mask, moved_obs["action_mask"])
+            env.step(action)
+            moved_env.step(int(moved_action))
+        assert env.winner == moved_env.winner
+
+
+# Symmetric positions share their canonical form and hash, and the symmetry returned by canonical_form maps each of
+# them to the same canonical variant
+def test_canonical_hash_of_symmetric_replays(random_game, play):
+    moves = random_game(0)
+    for s in TABLES.common_symmetries:
+        env = raw_env()
+        env.reset()
+        moved_env = raw_env()
+        moved_env.reset()
+        for agent, action in moves:
+            play(env, [(agent, action)])
+            moved_action = int(TABLES.action_permutations[agent][s][action])
+            play(moved_env, [(agent, moved_action)])
+            key, _ = canonical_form(env.board, agent)
+            moved_key, _ = canonical_form(moved_env.board, agent)
+            assert key == moved_key
+            assert canonical_hash(env.board, agent) == canonical_hash(
+                moved_env.board, agent
+            )
+
+
+def test_canonical_hash_depends_on_side_to_move():
+    env = raw_env()
+    env.reset()
+    assert canonical_hash(env.board, "player_0") != canonical_hash(
+        env.board, "player_1"
+    )
+
+
+# Regions bordering only the cathedral have NaN territory, which has its own value in the position planes
+def test_canonical_hash_of_nan_territory(nan_territory_env):
+    env = nan_territory_env
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        planes = position_planes(env.board)
+        assert canonical_hash(env.board) == canonical_hash(env.board)
+    empty = env.board.squares == 0
+    np.testing.assert_array_equal(planes[1][empty & np.isnan(env.board.territory)], 4)
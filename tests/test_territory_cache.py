@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from cathedral_rl.game.board import Board
+from cathedral_rl.game.cache import LRUCache
+from cathedral_rl.game.cathedral import raw_env
+
+
+# Territories, rewards and scores are the same with the territory cache enabled and disabled
+@pytest.mark.parametrize("seed", range(3))
+def test_territory_cache_matches_flood_fill(random_game, seed):
+    moves = random_game(seed)
+    cache = Board.territory_cache
+    territory_cache = LRUCache(1 << 24)
+    try:
+        envs = []
+        for enabled in [True, False]:
+            Board.territory_cache = territory_cache if enabled else None
+            env = raw_env(per_move_rewards=True)
+            # Each game is played twice, so that the second game reads every territory from the cache
+            for _ in range(2):
+                env.reset()
+                territories = []
+                for agent, action in moves:
+                    env.observe(agent)
+                    env.step(action)
+                    territories.append(env.board.territory.copy())
+            envs.append((env, territories))
+        (cached_env, cached_territories), (env, territories) = envs
+        assert territory_cache.stats()["hits"] >= len(moves)
+        np.testing.assert_array_equal(cached_territories, territories)
+        assert cached_env.rewards == env.rewards
+        assert cached_env.score == env.score
+        assert cached_env.winner == env.winner
+    finally:
+        Board.territory_cache = cache